@@ -1,4 +1,7 @@
 import os
+import tempfile
+
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -36,4 +39,26 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_queries',
 ]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_caches():
+    # Файлы кэша во временном каталоге, как в core.test_runner: тесты не
+    # должны очищать кэш запущенного сервера разработки.
+    from django.test.utils import override_settings
+
+    from core.test_runner import isolated_caches as caches_in
+
+    with tempfile.TemporaryDirectory() as directory:
+        with override_settings(CACHES=caches_in(directory)):
+            yield
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_teardown(item):
+    # Превью строятся в фоновом пуле: дожидаемся их до того, как фикстуры
+    # удалят временный MEDIA_ROOT.
+    from posts import thumbnails
+    thumbnails.drain()
@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+
+import pytest
+from core.queries import QueryRecorder, budget_for
+
+
+@pytest.fixture
+def query_budget():
+    """Проверяет, что запросы внутри блока with укладываются в бюджет SQL
+    страницы с таким именем URL и не выполняют N+1.
+
+    Время запросов не проверяется: на медленной машине с холодным кэшем
+    оно выходит за QUERY_TIME_BUDGET без всякой регрессии.
+    """
+    @contextmanager
+    def check(view_name):
+        with QueryRecorder() as recorder:
+            yield recorder
+        problems = recorder.problems(budget_for(view_name), check_time=False)
+        assert not problems, (
+            f'Страница `{view_name}` вышла за бюджет SQL: '
+            + '; '.join(problems)
+        )
+    return check
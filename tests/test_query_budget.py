@@ -0,0 +1,63 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from posts import urls
+from posts.models import Comment, Follow, Group, Post
+
+URL_NAMES = [pattern.name for pattern in urls.urlpatterns]
+
+
+@pytest.fixture
+def feed(mixer, user, another_user):
+    """Несколько постов, комментариев и подписок: N+1 на них заметен."""
+    group = Group.objects.create(title='Группа', slug='group', description='')
+    posts = [
+        Post.objects.create(
+            text=f'Пост {number} #котики @{another_user.username}',
+            author=author,
+            group=group,
+        )
+        for number in range(3)
+        for author in (user, another_user)
+    ]
+    for post in posts:
+        mixer.cycle(3).blend(Comment, post=post, author=another_user)
+    Follow.objects.create(user=user, author=another_user)
+    cache.clear()
+    return posts[0]
+
+
+def url_kwargs(name, post):
+    return {
+        'post_detail': {'post_id': post.pk},
+        'post_edit': {'post_id': post.pk},
+        'group_list': {'slug': post.group.slug},
+        'profile': {'username': post.author.username},
+        'tag': {'name': 'котики'},
+        'mention': {'name': 'anotheruser'},
+        'add_comment': {'post_id': post.pk},
+        'post_comments': {'post_id': post.pk},
+        'profile_follow': {'username': 'AnotherUser'},
+        'profile_unfollow': {'username': 'AnotherUser'},
+    }.get(name, {})
+
+
+class TestQueryBudget:
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('name', URL_NAMES)
+    @pytest.mark.parametrize('authenticated', [False, True])
+    def test_url_fits_query_budget(
+        self, name, authenticated, feed, user, client, query_budget
+    ):
+        view_name = f'posts:{name}'
+        url = reverse(view_name, kwargs=url_kwargs(name, feed))
+        if name == 'search':
+            url += '?q=пост'
+        if authenticated:
+            client.force_login(user)
+        with query_budget(view_name):
+            response = client.get(url)
+        assert response.status_code in (200, 302), (
+            f'Страница `{url}` вернула {response.status_code}'
+        )
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .cache import clear_after_migrate
+        from .db import configure_connection
+
+        post_migrate.connect(
+            clear_after_migrate, dispatch_uid='core.clear_after_migrate'
+        )
+        connection_created.connect(
+            configure_connection, dispatch_uid='core.configure_connection'
+        )
@@ -0,0 +1,423 @@
+"""Общий для всех процессов кэш в файле SQLite.
+
+У LocMemCache каждый воркер держит свою копию кэша: сброс кэша в одном
+процессе не виден остальным, а память расходуется N раз. Этот бэкенд
+хранит записи в одном файле SQLite в режиме WAL, так что читатели не
+блокируют друг друга и писателя, а все процессы видят одни и те же
+данные. Внешних зависимостей нет, только стандартный sqlite3.
+
+Целые числа хранятся как INTEGER, остальные значения — pickle. incr
+атомарен между процессами (BEGIN IMMEDIATE). Размер ограничен
+MAX_ENTRIES: при переполнении сначала удаляются просроченные записи,
+затем давно не читанные (LRU), по 1/CULL_FREQUENCY за раз.
+
+TwoTierCache ставит перед общим кэшем ограниченный LRU в памяти
+процесса: горячие ключи читаются без обращения к файлу.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# SQLite по умолчанию принимает не больше 999 параметров в запросе.
+MAX_PARAMS = 900
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entries ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_entries_accessed '
+    'ON cache_entries (accessed)',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+def _encode(value):
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+def _chunks(items, size=MAX_PARAMS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    # Размер кэша проверяется раз в столько записей одного процесса.
+    cull_check_interval = 64
+    # Метка доступа для LRU обновляется не чаще раза в столько секунд.
+    touch_resolution = 1.0
+    busy_timeout = 5.0
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=self.busy_timeout, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fetch(self, keys):
+        """Живые записи по ключам бэкенда; обновляет им метку доступа."""
+        now = time.time()
+        connection = self._connection()
+        found, stale = {}, []
+        for chunk in _chunks(keys):
+            rows = connection.execute(
+                'SELECT key, value, accessed FROM cache_entries '
+                f'WHERE key IN ({", ".join("?" * len(chunk))}) AND {ALIVE}',
+                [*chunk, now],
+            )
+            for key, value, accessed in rows:
+                found[key] = _decode(value)
+                if accessed < now - self.touch_resolution:
+                    stale.append(key)
+        for chunk in _chunks(stale):
+            connection.execute(
+                'UPDATE cache_entries SET accessed = ? '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                [now, *chunk],
+            )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        backend_keys = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(backend_keys))
+        return {backend_keys[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            f'SELECT 1 FROM cache_entries WHERE key = ? AND {ALIVE}',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), _encode(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache_entries '
+                'VALUES (?, ?, ?, ?)',
+                rows,
+            )
+        self._written(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'INSERT INTO cache_entries VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires, accessed = excluded.accessed '
+                'WHERE cache_entries.expires <= ?',
+                (key, _encode(value), self.get_backend_timeout(timeout),
+                 now, now),
+            )
+        self._written(1)
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            f'UPDATE cache_entries SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                f'SELECT value FROM cache_entries WHERE key = ? AND {ALIVE}',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = _decode(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entries SET value = ?, accessed = ? '
+                'WHERE key = ?',
+                (_encode(value), time.time(), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'DELETE FROM cache_entries WHERE key = ?', (key,)
+        )
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._transaction() as connection:
+            for chunk in _chunks(keys):
+                connection.execute(
+                    'DELETE FROM cache_entries '
+                    f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                    chunk,
+                )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def _written(self, count):
+        self._writes += count
+        if self._writes >= self.cull_check_interval:
+            self._writes = 0
+            self._cull()
+
+    def _cull(self):
+        with self._transaction() as connection:
+            (total,) = connection.execute(
+                'SELECT COUNT(*) FROM cache_entries'
+            ).fetchone()
+            if total <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache_entries')
+                return
+            total -= connection.execute(
+                'DELETE FROM cache_entries WHERE expires <= ?',
+                (time.time(),),
+            ).rowcount
+            if total > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache_entries WHERE key IN ('
+                    ' SELECT key FROM cache_entries'
+                    ' ORDER BY accessed LIMIT ?)',
+                    (total // self._cull_frequency,),
+                )
+
+
+class LocalStore:
+    """LRU процесса: ключ -> (pickle значения, срок жизни)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+        return pickle.loads(entry[0])
+
+    def set(self, key, value, expires):
+        entry = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Django создаёт бэкенды кэша в каждом потоке заново, а LRU нужен один
+# на процесс: храним его отдельно, по имени общего кэша.
+_local_stores = {}
+_local_stores_lock = threading.Lock()
+_missing = object()
+
+
+class TwoTierCache(BaseCache):
+    """LRU процесса перед общим кэшем (LOCATION — его алиас в CACHES).
+
+    Чтение сначала смотрит в память процесса, запись идёт в оба уровня,
+    так что свои изменения процесс видит сразу. Чужие — не позже чем
+    через LOCAL_TIMEOUT секунд: дольше локальная копия не живёт. Этого
+    хватает для согласованности через номера версий: ключи лент и
+    объектов включают поколения (posts.caching), и после увеличения
+    поколения в одном воркере остальные перестают читать старые ключи,
+    как только у них истечёт локальная копия счётчика.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 2)
+        with _local_stores_lock:
+            self._local = _local_stores.setdefault(
+                location, LocalStore(self._max_entries)
+            )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout=DEFAULT_TIMEOUT):
+        local_expires = time.time() + self._local_timeout
+        shared_expires = self.shared.get_backend_timeout(timeout)
+        if shared_expires is None:
+            return local_expires
+        return min(local_expires, shared_expires)
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        value = self._local.get(local_key, _missing)
+        if value is _missing:
+            value = self.shared.get(key, _missing, version=version)
+            if value is _missing:
+                return default
+            self._local.set(local_key, value, self._expires())
+        return value
+
+    def get_many(self, keys, version=None):
+        found, missed = {}, []
+        for key in keys:
+            value = self._local.get(self._local_key(key, version), _missing)
+            if value is _missing:
+                missed.append(key)
+            else:
+                found[key] = value
+        if missed:
+            fetched = self.shared.get_many(missed, version=version)
+            expires = self._expires()
+            for key, value in fetched.items():
+                self._local.set(self._local_key(key, version), value, expires)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        local_key = self._local_key(key, version)
+        if self._local.get(local_key, _missing) is not _missing:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local.set(
+            self._local_key(key, version), value, self._expires(timeout)
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version) or []
+        expires = self._expires(timeout)
+        for key, value in data.items():
+            if key not in failed:
+                self._local.set(self._local_key(key, version), value, expires)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local.set(local_key, value, self._expires(timeout))
+        else:
+            self._local.delete(local_key)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local.delete(self._local_key(key, version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        try:
+            value = self.shared.incr(key, delta, version=version)
+        except ValueError:
+            self._local.delete(local_key)
+            raise
+        self._local.set(local_key, value, self._expires())
+        return value
+
+    def delete(self, key, version=None):
+        self._local.delete(self._local_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        self._local.clear()
+        self.shared.clear()
+
+
+def clear_after_migrate(**kwargs):
+    """Сбрасывает общий кэш после миграций.
+
+    Такой кэш переживает перезапуск процессов, и в нём могут остаться
+    объекты старой схемы или ссылки на записи пересозданной базы.
+    """
+    caches['default'].clear()
@@ -0,0 +1,23 @@
+"""Настройка соединений SQLite.
+
+По умолчанию SQLite пишет журнал отката (journal_mode=DELETE): пока
+писатель держит транзакцию, читатели ждут, а каждая транзакция
+синхронизирует файл с диском. При каждом новом соединении Django
+выполняет здесь PRAGMA из settings.SQLITE_PRAGMAS: WAL (читатели не
+блокируются писателем), synchronous=NORMAL, размер mmap и страничного
+кэша и время ожидания занятой базы. С CONN_MAX_AGE соединение
+переиспользуется между запросами, и настройка выполняется один раз.
+"""
+from django.conf import settings
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            cursor.execute(statement)
@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+COUNTER = 'bench:counter'
+
+
+def _backends(directory):
+    params = {'OPTIONS': {'MAX_ENTRIES': 100_000}}
+    return {
+        'locmem': lambda: LocMemCache('bench', params),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'files'), params
+        ),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), params
+        ),
+    }
+
+
+def _work(factory, worker, ops):
+    cache = factory()
+    for i in range(ops):
+        key = f'bench:{worker}:{i % 100}'
+        cache.set(key, {'worker': worker, 'i': i})
+        cache.get(key)
+        cache.incr(COUNTER)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша под нагрузкой из нескольких процессов: '
+        'операций в секунду и согласованность общего счётчика incr.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        workers, ops = options['workers'], options['ops']
+        expected = workers * ops
+        context = multiprocessing.get_context('fork')
+        self.stdout.write('бэкенд        опер./с     счётчик   согласован')
+        with tempfile.TemporaryDirectory() as directory:
+            for name, factory in _backends(directory).items():
+                cache = factory()
+                cache.set(COUNTER, 0)
+                processes = [
+                    context.Process(target=_work, args=(factory, worker, ops))
+                    for worker in range(workers)
+                ]
+                started = time.perf_counter()
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+                elapsed = time.perf_counter() - started
+                counter = cache.get(COUNTER)
+                self.stdout.write(
+                    f'{name:<10} {expected * 3 / elapsed:>11.0f} '
+                    f'{counter:>11} '
+                    f'{"да" if counter == expected else "нет":>12}'
+                )
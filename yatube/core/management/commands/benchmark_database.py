@@ -0,0 +1,146 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import pragma_statements
+
+SCHEMA = (
+    'CREATE TABLE post ('
+    ' id INTEGER PRIMARY KEY, author_id INTEGER, pub_date REAL, text TEXT)',
+    'CREATE INDEX post_author_date'
+    ' ON post (author_id, pub_date DESC, id DESC)',
+)
+FEED = (
+    'SELECT id, text FROM post WHERE author_id = ? '
+    'ORDER BY pub_date DESC, id DESC LIMIT 10'
+)
+AUTHORS = 100
+# (название, одно соединение на процесс, PRAGMA из настроек): каждая
+# строка меняет по одному фактору относительно предыдущей.
+MODES = (
+    ('по умолчанию', False, False),
+    ('соединение', True, False),
+    ('настроенный', True, True),
+)
+
+
+def _connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if pragmas:
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            connection.execute(statement)
+    return connection
+
+
+def _requests(path, persistent, pragmas, deadline):
+    """Соединение на каждый запрос (CONN_MAX_AGE=0) или одно на процесс."""
+    connection = _connect(path, pragmas) if persistent else None
+    while time.time() < deadline:
+        current = connection or _connect(path, pragmas)
+        yield current
+        if connection is None:
+            current.close()
+
+
+def _read(path, mode, deadline, counter, errors):
+    for number, connection in enumerate(_requests(path, *mode, deadline)):
+        try:
+            connection.execute(FEED, (number % AUTHORS,)).fetchall()
+        except sqlite3.OperationalError:
+            with errors.get_lock():
+                errors.value += 1
+            continue
+        with counter.get_lock():
+            counter.value += 1
+
+
+def _write(path, mode, deadline, counter, errors):
+    for number, connection in enumerate(_requests(path, *mode, deadline)):
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'INSERT INTO post (author_id, pub_date, text) '
+                'VALUES (?, ?, ?)',
+                (number % AUTHORS, time.time(), 'комментарий ' * 20),
+            )
+            connection.execute('COMMIT')
+        except sqlite3.OperationalError:
+            with errors.get_lock():
+                errors.value += 1
+            continue
+        with counter.get_lock():
+            counter.value += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite по умолчанию (журнал отката, соединение на '
+        'запрос), с постоянным соединением и с постоянным соединением и '
+        'настройками settings.SQLITE_PRAGMAS: читатели и писатели '
+        'работают с одной базой одновременно, считаются операции в '
+        'секунду и ошибки «database is locked».'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--rows', type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(
+            'режим         чтений/с   записей/с   ошибок'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for number, (label, *mode) in enumerate(MODES):
+                path = os.path.join(directory, f'bench-{number}.sqlite3')
+                self.prepare(path, mode[1], options['rows'])
+                reads = context.Value('i', 0)
+                writes = context.Value('i', 0)
+                errors = context.Value('i', 0)
+                deadline = time.time() + options['seconds']
+                processes = [
+                    context.Process(
+                        target=_read,
+                        args=(path, mode, deadline, reads, errors),
+                    )
+                    for _ in range(options['readers'])
+                ] + [
+                    context.Process(
+                        target=_write,
+                        args=(path, mode, deadline, writes, errors),
+                    )
+                    for _ in range(options['writers'])
+                ]
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+                seconds = options['seconds']
+                self.stdout.write(
+                    f'{label:<12}'
+                    f'{reads.value / seconds:>10.0f}'
+                    f'{writes.value / seconds:>12.0f}'
+                    f'{errors.value:>9}'
+                )
+
+    def prepare(self, path, pragmas, rows):
+        connection = _connect(path, pragmas)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (author_id, pub_date, text) VALUES (?, ?, ?)',
+            (
+                (number % AUTHORS, number, 'пост ' * 40)
+                for number in range(rows)
+            ),
+        )
+        connection.execute('COMMIT')
+        connection.close()
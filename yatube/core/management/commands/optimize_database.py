@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Флаг 0x10000 (проверить все таблицы, а не только прочитанные этим
+# соединением) есть в PRAGMA optimize с SQLite 3.46. В более старых
+# версиях у нового соединения команды optimize ничего не делает.
+OPTIMIZE_ALL_TABLES = (3, 46, 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет статистику планировщика SQLite. Запускается по '
+        'расписанию (например, раз в час): PRAGMA optimize проверяет все '
+        'таблицы, анализирует те, для которых статистика устарела, и '
+        'читает не больше --analysis-limit строк индекса. На SQLite '
+        'старше 3.46, если статистики ещё нет, или с --analyze, '
+        'запускается ANALYZE с тем же ограничением; --checkpoint '
+        'сбрасывает WAL в базу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--analysis-limit', type=int, default=1000)
+        parser.add_argument('--analyze', action='store_true')
+        parser.add_argument('--checkpoint', action='store_true')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite.')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'PRAGMA analysis_limit = {options["analysis_limit"]}'
+            )
+            version = connection.Database.sqlite_version_info
+            if (options['analyze'] or version < OPTIMIZE_ALL_TABLES
+                    or not self.has_statistics(cursor)):
+                cursor.execute('ANALYZE')
+            else:
+                cursor.execute('PRAGMA optimize = 0x10002')
+            if options['checkpoint']:
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            analyzed = 0
+            if self.has_statistics(cursor):
+                cursor.execute('SELECT count(*) FROM sqlite_stat1')
+                analyzed = cursor.fetchone()[0]
+        self.stdout.write(f'Строк статистики sqlite_stat1: {analyzed}')
+
+    @staticmethod
+    def has_statistics(cursor):
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        )
+        return cursor.fetchone() is not None
@@ -0,0 +1,56 @@
+import logging
+
+from django.conf import settings
+
+from . import routers
+from .queries import QueryRecorder, budget_for
+
+logger = logging.getLogger('core.queries')
+
+
+class PrimaryPinMiddleware:
+    """Read-your-writes для чтения с реплики (core.routers).
+
+    Запрос, который записал что-нибудь в базу, ставит cookie, и
+    следующие REPLICA_PIN_SECONDS запросы пользователя читают с основной
+    базы. Стоит первым в MIDDLEWARE, чтобы учесть и записи сессий.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.start_request(routers.PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.finish_request()
+        if wrote:
+            response.set_cookie(
+                routers.PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Пишет в лог запросы, вышедшие за бюджет SQL или выполнившие N+1.
+
+    Бюджет берётся по имени URL (core.queries.budget_for); запросы
+    внешних middleware, например сессий, тоже учитываются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        for problem in recorder.problems(budget_for(view_name)):
+            logger.warning('%s %s: %s', request.method, request.path, problem)
+        return response
@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class StoredFile(models.Model):
+    """Файл хранилища по содержимому и число ссылок на него."""
+    objects = None
+    name = models.CharField(
+        'Имя файла',
+        max_length=255,
+        primary_key=True
+    )
+    references = models.PositiveIntegerField(
+        'Число ссылок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
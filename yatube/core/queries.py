@@ -0,0 +1,100 @@
+"""Бюджет SQL-запросов на один HTTP-запрос и поиск N+1.
+
+QueryRecorder подключает execute_wrapper ко всем соединениям и
+записывает каждый запрос: текст с плейсхолдерами, параметры и время.
+Отпечаток запроса — его текст без параметров, со свёрнутыми списками
+IN (...) и VALUES, так что запросы одной формы совпадают. N+1 — это
+отпечаток, выполненный не меньше N_PLUS_ONE_THRESHOLD раз с разными
+параметрами: обычно так выглядит обращение к связанному объекту в
+цикле шаблона.
+
+QueryBudgetMiddleware пишет в лог 'core.queries' запросы, которые
+вышли за бюджет (QUERY_BUDGET / QUERY_BUDGETS по имени URL и
+QUERY_TIME_BUDGET) или выполнили N+1; тесты проверяют бюджеты тем же
+QueryRecorder.
+"""
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+VALUES_LIST = re.compile(r'(VALUES\s*\(%s\))(?:\s*,\s*\(%s\))+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Форма запроса: одинакова для запросов, отличающихся параметрами."""
+    sql = WHITESPACE.sub(' ', sql.strip())
+    sql = PLACEHOLDER_LIST.sub('(%s, ...)', sql)
+    return VALUES_LIST.sub(r'\1, ...', sql)
+
+
+def budget_for(view_name):
+    """Сколько запросов можно выполнить странице с таким именем URL."""
+    return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET)
+
+
+class QueryRecorder:
+    """Записывает SQL-запросы всех соединений внутри блока with."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __enter__(self):
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, params, time.perf_counter() - started)
+            )
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def repeated(self):
+        """Отпечаток -> число выполнений для запросов N+1."""
+        params_by_shape = defaultdict(list)
+        for sql, params, _ in self.queries:
+            params_by_shape[fingerprint(sql)].append(repr(params))
+        return {
+            shape: len(params)
+            for shape, params in params_by_shape.items()
+            if len(set(params)) >= settings.N_PLUS_ONE_THRESHOLD
+        }
+
+    def problems(self, budget, check_time=True):
+        """Описания нарушений бюджета и N+1; пустой список, если их нет.
+
+        С check_time=False время запросов не проверяется (тесты: оно
+        зависит от машины и холодных кэшей).
+        """
+        found = []
+        if self.count > budget:
+            found.append(f'{self.count} SQL-запросов при бюджете {budget}')
+        if check_time and self.duration > settings.QUERY_TIME_BUDGET:
+            found.append(
+                f'SQL занял {self.duration * 1000:.0f} мс при бюджете '
+                f'{settings.QUERY_TIME_BUDGET * 1000:.0f} мс'
+            )
+        for shape, times in self.repeated().items():
+            found.append(f'N+1: {times} раз {shape}')
+        return found
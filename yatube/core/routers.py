@@ -0,0 +1,84 @@
+"""Чтение с реплики для страниц, которые только читают.
+
+Представления, помеченные replica_reads, читают с базы REPLICA, если
+она описана в DATABASES; все записи идут в основную базу. Реплика
+отстаёт, поэтому после собственной записи пользователь
+REPLICA_PIN_SECONDS читает с основной базы: PrimaryPinMiddleware
+ставит ему cookie (read-your-writes). Запрос, который уже что-то
+записал или находится в транзакции, тоже читает с основной базы.
+"""
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+PIN_COOKIE = 'pin_primary'
+
+_state = threading.local()
+
+
+def reading_replica():
+    """Идут ли чтения текущего запроса на реплику."""
+    return (
+        getattr(_state, 'replica', False)
+        and not getattr(_state, 'pinned', False)
+        and not getattr(_state, 'wrote', False)
+        and REPLICA in connections.databases
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def cache_timeout(timeout):
+    """Срок кэша для значения, прочитанного в текущем запросе.
+
+    Реплика может ещё не догнать запись, поколение которой уже
+    увеличено: прочитанное с неё кэшируется не дольше окна
+    REPLICA_PIN_SECONDS, а не до следующей записи.
+    """
+    if not reading_replica():
+        return timeout
+    if timeout is None:
+        return settings.REPLICA_PIN_SECONDS
+    return min(timeout, settings.REPLICA_PIN_SECONDS)
+
+
+def replica_reads(view):
+    """Представление читает с реплики."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        _state.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = False
+    return wrapper
+
+
+def start_request(pinned):
+    _state.pinned = pinned
+    _state.wrote = False
+
+
+def finish_request():
+    """Заканчивает запрос; возвращает True, если в нём была запись."""
+    wrote = getattr(_state, 'wrote', False)
+    _state.pinned = _state.wrote = False
+    return wrote
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if reading_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплику вместе с данными.
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,122 @@
+"""Хранилище файлов по содержимому.
+
+Файл сохраняется под именем из SHA-256 своего содержимого, разложенным
+по подкаталогам: posts/ab/cd/abcd….jpg. Повторная загрузка тех же байтов
+не пишет файл заново, а только увеличивает число ссылок на него
+(core.models.StoredFile), и ни один каталог не разрастается до
+миллионов записей. release() снимает ссылку и удаляет файл, когда
+ссылок не осталось. Проверка файла на диске, изменение числа ссылок и
+удаление файла идут под одной блокировкой (lock()), поэтому загрузка
+тех же байтов не может сослаться на файл, который удаляет release() или
+сборщик мусора.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import StoredFile
+
+# Имя файла, сохранённого этим хранилищем.
+CONTENT_NAME = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def content_name(directory, digest, extension):
+        return os.path.join(
+            directory, digest[:2], digest[2:4], f'{digest}{extension}'
+        ).replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменит хеш содержимого, а занятое имя означает
+        # тот же самый файл.
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        # Хеш считается по ходу записи во временный файл: содержимое
+        # читается один раз, даже если не помещается в память.
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), suffix='.upload'
+        )
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(descriptor, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = self.content_name(directory, digest.hexdigest(), extension)
+            full_path = self.path(name)
+            with self.lock(name):
+                # Сначала ссылка, потом проверка: файл, найденный на
+                # диске, уже не удалит ни release(), ни сборщик мусора.
+                self.add_references(name)
+                if os.path.exists(full_path):
+                    os.remove(temp_path)
+                    # Время изменения — последняя загрузка: сборщик
+                    # мусора (collect_orphaned_media) не трогает свежие
+                    # файлы.
+                    os.utime(full_path)
+                else:
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                    os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    @contextmanager
+    def lock(self, name):
+        """Транзакция, до конца которой другие загрузки, release() и
+        сборщик мусора ждут с файлом name.
+
+        Первый запрос транзакции — запись: SQLite сразу берёт блокировку
+        записи (как BEGIN IMMEDIATE) и держит её до коммита, другие СУБД
+        блокируют строку StoredFile.
+        """
+        with transaction.atomic():
+            StoredFile.objects.filter(name=name).update(
+                references=F('references')
+            )
+            yield
+
+    def add_references(self, name, count=1):
+        updated = StoredFile.objects.filter(name=name).update(
+            references=F('references') + count
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    StoredFile.objects.create(name=name, references=count)
+            except IntegrityError:
+                self.add_references(name, count)
+
+    def release(self, name):
+        """Снимает ссылку на файл; удаляет его, если ссылок не осталось.
+
+        Возвращает True, если файл удалён. Файлы, сохранённые до
+        хранилища по содержимому, не учитываются и не трогаются.
+        """
+        with self.lock(name):
+            released = StoredFile.objects.filter(
+                name=name, references__gt=0
+            ).update(references=F('references') - 1)
+            if not released:
+                return False
+            deleted, _ = StoredFile.objects.filter(
+                name=name, references=0
+            ).delete()
+            if deleted:
+                super().delete(name)
+        return bool(deleted)
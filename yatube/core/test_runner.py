@@ -0,0 +1,46 @@
+"""Тесты не трогают кэш запущенного сервера разработки.
+
+Файловые кэши SQLiteCache (settings.CACHES) на время тестов переносятся
+во временный каталог: иначе clear_after_migrate и cache.clear() в
+тестах очищали бы общий cache.sqlite3, а состояние переходило бы из
+одного прогона в другой. Для pytest то же делает tests/conftest.py.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+SQLITE_CACHE = 'core.cache.SQLiteCache'
+
+
+def isolated_caches(directory):
+    """CACHES с файлами SQLiteCache внутри directory."""
+    caches = {}
+    for alias, params in settings.CACHES.items():
+        if params['BACKEND'] == SQLITE_CACHE:
+            params = {
+                **params,
+                'LOCATION': os.path.join(
+                    directory, os.path.basename(params['LOCATION'])
+                ),
+            }
+        caches[alias] = params
+    return caches
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp()
+        self.cache_override = override_settings(
+            CACHES=isolated_caches(self.cache_directory)
+        )
+        self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
 from .models import Group, Post
+from .search import match_expression, matching_ids
 
 
 @admin.register(Post)
@@ -18,6 +20,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо icontains по таблице."""
+        expression = match_expression(search_term)
+        if not expression:
+            return queryset, False
+        return queryset.filter(
+            pk__in=RawSQL(*matching_ids(expression))
+        ), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,438 @@
+"""Поколения кэша лент и страниц.
+
+У каждой ленты есть счётчик-поколение: общий для главной, отдельный для
+каждой группы, каждого автора и каждого поста. Номер поколения входит в
+ключ кэша фрагмента, а запись поста увеличивает счётчики затронутых лент,
+поэтому фрагменты можно хранить часами: после записи старые ключи просто
+перестают читаться и со временем вытесняются.
+
+Те же поколения служат surrogate-ключами для кэша целых страниц
+(posts.middleware): страница запоминает номера поколений своих ключей и
+считается устаревшей, как только любой из них увеличился.
+
+Дорогие значения (фрагменты лент, COUNT(*) страниц) пересчитываются
+через cached_recompute: один процесс под замком, остальные тем временем
+получают прежнее значение.
+"""
+import hashlib
+import math
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.middleware.csrf import get_token
+
+from core.routers import cache_timeout, reading_replica
+
+from . import counters
+from .models import AuthorStats, Follow, Group
+
+User = get_user_model()
+
+GLOBAL = 'global'
+GENERATION_KEY = 'posts:generation:{scope}'
+CARD_KEY = 'posts:card:{pk}:{version}'
+PAGE_KEY = 'posts:page:{digest}'
+PAGE_STATS_KEY = 'posts:page-stats:{outcome}'
+GROUPS_KEY = 'posts:groups:{generation}'
+USERNAME_KEY = 'posts:username:{username}'
+AUTHOR_KEY = 'posts:author:{pk}:{generation}'
+FOLLOWED_KEY = 'posts:followed:{pk}:{generation}'
+COUNT_KEY = 'posts:count:{digest}'
+LOCK_KEY = 'posts:lock:{key}'
+RECOMPUTE_STATS_KEY = 'posts:recompute-stats:{outcome}'
+RECOMPUTE_OUTCOMES = ('recomputed', 'early', 'coalesced')
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def author_card_scope(author_id):
+    """Карточки постов автора: меняются с его именем, а не с лентой."""
+    return f'author-card:{author_id}'
+
+
+def group_card_scope(group_id):
+    return f'group-card:{group_id}'
+
+
+def scope_of(obj):
+    """Лента объекта: группа, автор или, по умолчанию, главная."""
+    if isinstance(obj, Group):
+        return group_scope(obj.pk)
+    if isinstance(obj, User):
+        return author_scope(obj.pk)
+    return GLOBAL
+
+
+def _initial():
+    # Счётчик мог быть вытеснен из кэша: начинаем с метки времени, а не с
+    # единицы, чтобы не вернуться к номеру, под которым уже лежат старые
+    # фрагменты.
+    return int(time.time() * 1000)
+
+
+def generation(scope):
+    key = GENERATION_KEY.format(scope=scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump(*scopes):
+    for scope in set(scopes):
+        key = GENERATION_KEY.format(scope=scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+
+
+def post_scopes(post, previous_group_id=None):
+    """Ленты, в которых виден пост (и группа, из которой его убрали)."""
+    scopes = [GLOBAL, author_scope(post.author_id), post_scope(post.pk)]
+    for group_id in (post.group_id, previous_group_id):
+        if group_id is not None:
+            scopes.append(group_scope(group_id))
+    return scopes
+
+
+def _card_scopes(post):
+    scopes = [author_card_scope(post.author_id)]
+    if post.group_id is not None:
+        scopes.append(group_card_scope(post.group_id))
+    return scopes
+
+
+def card_keys(posts):
+    """Ключи карточек постов.
+
+    Ключ меняется при сохранении поста, а также его автора и группы,
+    чьи имя и адрес есть в карточке. Новые посты в ленте карточки не
+    задевают: у авторов и групп для этого отдельные поколения, и все
+    они читаются одним get_many.
+    """
+    scopes = {scope for post in posts for scope in _card_scopes(post)}
+    found = cache.get_many(
+        [GENERATION_KEY.format(scope=scope) for scope in scopes]
+    )
+    generations = {
+        scope: found.get(GENERATION_KEY.format(scope=scope))
+        or generation(scope)
+        for scope in scopes
+    }
+    keys = []
+    for post in posts:
+        version = '-'.join(
+            [str(int(post.updated_at.timestamp() * 1_000_000))]
+            + [str(generations[scope]) for scope in _card_scopes(post)]
+        )
+        keys.append(CARD_KEY.format(pk=post.pk, version=version))
+    return keys
+
+
+def card_key(post):
+    return card_keys([post])[0]
+
+
+def groups():
+    """Список всех групп; запись любой группы увеличивает GLOBAL."""
+    key = GROUPS_KEY.format(generation=generation(GLOBAL))
+    group_list = cache.get(key)
+    if group_list is None:
+        group_list = list(Group.objects.all())
+        cache.set(
+            key, group_list, cache_timeout(settings.OBJECT_CACHE_TIMEOUT)
+        )
+    return group_list
+
+
+AUTHOR_FIELDS = (
+    'pk',
+    'username',
+    'first_name',
+    'last_name',
+    'stats__post_count',
+    'stats__follower_count',
+    'stats__following_count',
+)
+
+
+def _author_row(username):
+    """Поля профиля автора одним запросом или None."""
+    rows = User.objects.filter(username=username).values(*AUTHOR_FIELDS)
+    row = rows.first()
+    if row is not None and row['stats__post_count'] is None:
+        # Пользователь без строки AuthorStats (см. counters.stats_of).
+        counters.reconcile_authors(row['pk'], row['pk'])
+        row = rows.first()
+    return row
+
+
+def _author_from(row):
+    author = User(
+        pk=row['pk'],
+        username=row['username'],
+        first_name=row['first_name'],
+        last_name=row['last_name'],
+    )
+    stats = AuthorStats(
+        user_id=row['pk'],
+        post_count=row['stats__post_count'],
+        follower_count=row['stats__follower_count'],
+        following_count=row['stats__following_count'],
+    )
+    # Иначе присваивание author.stats спросит у роутера базу для записи,
+    # и core.routers сочтёт запрос пишущим.
+    for obj in (author, stats):
+        obj._state.adding = False
+        obj._state.db = router.db_for_read(type(obj))
+    author.stats = stats
+    return author
+
+
+def author_by_username(username):
+    """Автор со счётчиками (stats) по username или None.
+
+    В кэше лежат только поля профиля (AUTHOR_FIELDS), а не весь
+    пользователь с хешем пароля и почтой. Посты и подписки автора, а
+    также изменение и удаление самого пользователя увеличивают его
+    поколение, поэтому закэшированное не отстаёт. Поколение читается до
+    запроса к базе: запись, случившаяся между ними, не закэширует старые
+    данные под новым номером. Поэтому при первом обращении запоминается
+    только pk, а сами поля кладутся в кэш со второго.
+    """
+    username_key = USERNAME_KEY.format(username=username)
+    author_id = cache.get(username_key)
+    if author_id is not None:
+        author_key = AUTHOR_KEY.format(
+            pk=author_id, generation=generation(author_scope(author_id))
+        )
+        row = cache.get(author_key)
+        if row is not None and row['username'] == username:
+            return _author_from(row)
+    row = _author_row(username)
+    if row is None:
+        return None
+    if row['pk'] == author_id:
+        cache.set(
+            author_key, row, cache_timeout(settings.OBJECT_CACHE_TIMEOUT)
+        )
+    else:
+        cache.set(username_key, row['pk'], settings.OBJECT_CACHE_TIMEOUT)
+    return _author_from(row)
+
+
+def followed_ids(user_id):
+    """Множество id авторов, на которых подписан пользователь.
+
+    Подписка и отписка увеличивают поколение подписчика, а поколение
+    читается до запроса к базе, как в author_by_username.
+    """
+    key = FOLLOWED_KEY.format(
+        pk=user_id, generation=generation(author_scope(user_id))
+    )
+    ids = cache.get(key)
+    if ids is None:
+        ids = set(
+            Follow.objects
+            .filter(user_id=user_id)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(key, ids, cache_timeout(settings.OBJECT_CACHE_TIMEOUT))
+    return ids
+
+
+def _lock(key):
+    return cache.add(LOCK_KEY.format(key=key), 1, settings.CACHE_LOCK_TIMEOUT)
+
+
+def _recompute(key, compute, timeout, version, outcome, locked):
+    try:
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        timeout = cache_timeout(timeout)
+        cache.set(
+            key,
+            (value, version, finished - started, finished + timeout),
+            timeout + settings.CACHE_STALE_TIMEOUT,
+        )
+    finally:
+        if locked:
+            cache.delete(LOCK_KEY.format(key=key))
+    _count(RECOMPUTE_STATS_KEY.format(outcome=outcome))
+    return value
+
+
+def cached_recompute(key, compute, timeout, version=None):
+    """Значение compute() из кэша, пересчитываемое одним процессом.
+
+    Запись хранит версию (например, номера поколений) и срок свежести.
+    Устаревшую запись пересчитывает тот, кто первым взял замок. Если
+    истёк только срок, остальные до конца пересчёта отдают прежнее
+    значение (stale-while-revalidate): оно лежит в кэше ещё
+    CACHE_STALE_TIMEOUT после срока. Чтобы пересчёт не совпадал у всех в
+    один момент, свежая запись иногда пересчитывается заранее, тем
+    вероятнее, чем ближе срок и чем дольше считалось значение (XFetch).
+    Если прежнего значения нет или сменилась версия, прежнее значение
+    отдавать нельзя: страница закэшировала бы его под новыми
+    поколениями. Тогда ждущие опрашивают кэш до CACHE_LOCK_WAIT секунд
+    и считают сами, только если не дождались.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, stored_version, delta, expires = entry
+        now = time.time()
+        fresh = stored_version == version and now < expires
+        jitter = -delta * settings.CACHE_EARLY_BETA * math.log(
+            1 - random.random()
+        )
+        if fresh and now + jitter < expires:
+            return value
+        if _lock(key):
+            outcome = 'early' if fresh else 'recomputed'
+            return _recompute(key, compute, timeout, version, outcome, True)
+        if stored_version == version:
+            _count(RECOMPUTE_STATS_KEY.format(outcome='coalesced'))
+            return value
+        return _wait_or_recompute(key, compute, timeout, version, False)
+    return _wait_or_recompute(key, compute, timeout, version, _lock(key))
+
+
+def _wait_or_recompute(key, compute, timeout, version, locked):
+    """Ждёт значение версии version от держателя замка или считает сам."""
+    deadline = time.time() + settings.CACHE_LOCK_WAIT
+    while not locked and time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            _count(RECOMPUTE_STATS_KEY.format(outcome='coalesced'))
+            return entry[0]
+        locked = _lock(key)
+    return _recompute(key, compute, timeout, version, 'recomputed', locked)
+
+
+def cached_count(queryset, version):
+    """COUNT(*) запроса, закэшированный до смены version."""
+    digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    return cached_recompute(
+        COUNT_KEY.format(digest=digest),
+        queryset.count,
+        settings.COUNT_CACHE_TIMEOUT,
+        version,
+    )
+
+
+def tag_request(request, *scopes):
+    """Помечает страницу surrogate-ключами для кэша анонимных страниц.
+
+    Вызывается до выборки данных страницы: номера поколений запоминаются
+    сейчас, и запись, случившаяся во время рендера, не даст закэшировать
+    уже устаревшую страницу как свежую.
+    """
+    if not hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys = {}
+    for scope in scopes:
+        request.surrogate_keys[scope] = generation(scope)
+
+
+def etag_for(request, *scopes):
+    """ETag страницы из поколений её ключей и того, кто её смотрит.
+
+    Считается без запросов к ленте, поэтому при совпадении с
+    If-None-Match ответ 304 отдаётся до выборки и рендера страницы.
+    Страница, которую читают с реплики, ETag не получает: реплика могла
+    не догнать поколения, и браузер получал бы 304 на устаревшую копию
+    до следующей записи.
+    """
+    if reading_replica():
+        return None
+    generations = cache.get_many(
+        [GENERATION_KEY.format(scope=scope) for scope in scopes]
+    )
+    parts = [str(request.user.pk or 'anonymous')]
+    if request.user.is_authenticated:
+        # Формы страницы несут CSRF-токен, а вход меняет его секрет: 304
+        # после повторного входа оставил бы в браузере мёртвый токен.
+        # get_token заводит секрет, если его ещё нет, и страница получит
+        # тот же.
+        get_token(request)
+        parts.append(request.META['CSRF_COOKIE'])
+    for scope in scopes:
+        value = generations.get(GENERATION_KEY.format(scope=scope))
+        parts.append(f'{scope}={value or generation(scope)}')
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _page_key(url):
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return PAGE_KEY.format(digest=digest)
+
+
+def get_page(url):
+    """Закэшированный ответ или None, если его нет или он устарел."""
+    entry = cache.get(_page_key(url))
+    if entry is None:
+        return None
+    generations, response = entry
+    current = cache.get_many(
+        [GENERATION_KEY.format(scope=scope) for scope in generations]
+    )
+    for scope, value in generations.items():
+        if current.get(GENERATION_KEY.format(scope=scope)) != value:
+            return None
+    return response
+
+
+def set_page(url, response, generations):
+    cache.set(
+        _page_key(url),
+        (generations, response),
+        cache_timeout(settings.PAGE_CACHE_TIMEOUT),
+    )
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def _stats(template, outcomes, reset):
+    keys = {outcome: template.format(outcome=outcome) for outcome in outcomes}
+    values = cache.get_many(keys.values())
+    if reset:
+        cache.delete_many(keys.values())
+    return {outcome: values.get(key, 0) for outcome, key in keys.items()}
+
+
+def count_page(outcome):
+    """Считает попадания ('hit') и промахи ('miss') кэша страниц."""
+    _count(PAGE_STATS_KEY.format(outcome=outcome))
+
+
+def page_stats(reset=False):
+    return _stats(PAGE_STATS_KEY, ('hit', 'miss'), reset)
+
+
+def recompute_stats(reset=False):
+    """Пересчёты дорогих значений: сделанные по сроку или смене версии
+    ('recomputed'), заранее ('early') и сэкономленные ('coalesced')."""
+    return _stats(RECOMPUTE_STATS_KEY, RECOMPUTE_OUTCOMES, reset)
@@ -0,0 +1,129 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики хранятся в AuthorStats и Post.comment_count и меняются только
+атомарными UPDATE ... SET x = x ± 1 из сигналов сохранения и удаления,
+так что страницы читают готовые числа без агрегатных запросов.
+Расхождения (например, после bulk-операций в обход сигналов) чинит
+команда reconcile_counters.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, PostTag, Tag
+
+User = get_user_model()
+
+
+def bump_author(user_id, **deltas):
+    """Сдвигает счётчики пользователя, например post_count=1."""
+    AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def stats_of(user):
+    """Счётчики пользователя.
+
+    У пользователей, созданных в обход сигналов (bulk_create, фикстуры),
+    строки AuthorStats нет: она создаётся пересчётом при первом чтении.
+    """
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        reconcile_authors(user.pk, user.pk)
+        user.stats = AuthorStats.objects.get(user_id=user.pk)
+        return user.stats
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def _count_of(model, field):
+    """Подзапрос: число строк model, у которых field указывает на строку."""
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def reconcile_authors(first_pk, last_pk):
+    """Пересчитывает счётчики пользователей с pk из [first_pk, last_pk].
+
+    Возвращает число исправленных строк.
+    """
+    users = list(
+        User.objects
+        .filter(pk__gte=first_pk, pk__lte=last_pk)
+        .annotate(
+            real_posts=_count_of(Post, 'author'),
+            real_followers=_count_of(Follow, 'author'),
+            real_following=_count_of(Follow, 'user'),
+        )
+        .values_list('pk', 'real_posts', 'real_followers', 'real_following')
+    )
+    stored = AuthorStats.objects.in_bulk(
+        [row[0] for row in users], field_name='user_id'
+    )
+    created, changed = [], []
+    for pk, posts, followers, following in users:
+        stats = stored.get(pk)
+        if stats is None:
+            created.append(AuthorStats(
+                user_id=pk,
+                post_count=posts,
+                follower_count=followers,
+                following_count=following,
+            ))
+        elif (stats.post_count, stats.follower_count,
+              stats.following_count) != (posts, followers, following):
+            stats.post_count = posts
+            stats.follower_count = followers
+            stats.following_count = following
+            changed.append(stats)
+    AuthorStats.objects.bulk_create(created, ignore_conflicts=True)
+    AuthorStats.objects.bulk_update(
+        changed, ['post_count', 'follower_count', 'following_count']
+    )
+    return len(created) + len(changed)
+
+
+def reconcile_posts(first_pk, last_pk):
+    """Пересчитывает comment_count постов с pk из [first_pk, last_pk]."""
+    drifted = (
+        Post.objects
+        .filter(pk__gte=first_pk, pk__lte=last_pk)
+        .annotate(real_comments=_count_of(Comment, 'post'))
+        .exclude(comment_count=F('real_comments'))
+        .values_list('pk', 'real_comments')
+    )
+    repaired = 0
+    for pk, comments in drifted:
+        Post.objects.filter(pk=pk).update(comment_count=comments)
+        repaired += 1
+    return repaired
+
+
+def reconcile_tags():
+    """Пересчитывает Tag.post_count; возвращает число исправленных."""
+    drifted = (
+        Tag.objects
+        .annotate(real_posts=_count_of(PostTag, 'tag'))
+        .exclude(post_count=F('real_posts'))
+        .values_list('pk', 'real_posts')
+    )
+    repaired = 0
+    for pk, posts in drifted:
+        Tag.objects.filter(pk=pk).update(post_count=posts)
+        repaired += 1
+    return repaired
@@ -0,0 +1,206 @@
+"""Лента подписок: гибрид push и pull.
+
+Посты обычных авторов при публикации раскладываются по лентам
+подписчиков (TimelineEntry, push). Авторы, у которых подписчиков не
+меньше settings.FEED_PULL_THRESHOLD, помечаются PulledAuthor: их посты в
+ленты не пишутся, а подмешиваются при чтении k-way слиянием свежих
+постов каждого такого автора (pull). Так запись стоит не больше
+O(порог), а чтение — одного диапазона ленты плюс по запросу на
+«популярного» автора из подписок.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils.functional import cached_property
+
+from .models import AuthorStats, Follow, Post, PulledAuthor, TimelineEntry
+from .utils import CursorPaginator
+
+
+def _bulk_insert(user_posts):
+    """Вставляет записи ленты пачками, пропуская уже существующие."""
+    batch = []
+    for user_id, post_id, pub_date in user_posts:
+        batch.append(
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        )
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_pulled(author_id):
+    return PulledAuthor.objects.filter(author_id=author_id).exists()
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам всех подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    follower_ids = (
+        Follow.objects
+        .filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+        .iterator()
+    )
+    _bulk_insert(
+        (user_id, post.pk, post.pub_date) for user_id in follower_ids
+    )
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if is_pulled(author_id):
+        return
+    posts = (
+        Post.objects
+        .filter(author_id=author_id)
+        .values_list('pk', 'pub_date')
+        .iterator()
+    )
+    _bulk_insert((user_id, pk, pub_date) for pk, pub_date in posts)
+
+
+def prune_timeline(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id,
+    ).delete()
+
+
+def promote_author(author_id):
+    """Переводит автора на pull: его посты уходят из всех лент."""
+    _, created = PulledAuthor.objects.get_or_create(author_id=author_id)
+    if created:
+        TimelineEntry.objects.filter(post__author_id=author_id).delete()
+
+
+def demote_author(author_id):
+    """Возвращает автора на push и заполняет ленты его подписчиков."""
+    deleted, _ = PulledAuthor.objects.filter(author_id=author_id).delete()
+    if deleted:
+        follower_ids = (
+            Follow.objects
+            .filter(author_id=author_id)
+            .values_list('user_id', flat=True)
+        )
+        for user_id in follower_ids.iterator():
+            backfill_timeline(user_id, author_id)
+
+
+def on_follow(user_id, author_id):
+    """Новая подписка: порог популярности или обычное заполнение ленты."""
+    if is_pulled(author_id):
+        return
+    followers = (
+        AuthorStats.objects
+        .filter(user_id=author_id)
+        .values_list('follower_count', flat=True)
+        .first()
+    )
+    if (followers or 0) >= settings.FEED_PULL_THRESHOLD:
+        promote_author(author_id)
+    else:
+        backfill_timeline(user_id, author_id)
+
+
+def reclassify_authors():
+    """Сверяет пометки PulledAuthor с текущим числом подписчиков.
+
+    Понижение обратно на push делается только здесь, а не при отписке:
+    оно стоит O(подписчики × посты) и не должно дёргаться на каждом
+    колебании вокруг порога.
+    """
+    threshold = settings.FEED_PULL_THRESHOLD
+    pulled = set(PulledAuthor.objects.values_list('author_id', flat=True))
+    popular = set(
+        Follow.objects
+        .values('author_id')
+        .annotate(followers=Count('pk'))
+        .filter(followers__gte=threshold)
+        .values_list('author_id', flat=True)
+    )
+    for author_id in popular - pulled:
+        promote_author(author_id)
+    for author_id in pulled - popular:
+        demote_author(author_id)
+
+
+def repair_timeline(user_id, rebuild=False):
+    """Приводит ленту пользователя в соответствие с его подписками.
+
+    Записи авторов, на которых пользователь больше не подписан (или
+    которые переведены на pull), удаляются, недостающие посты подписок
+    добавляются. С rebuild=True лента сначала очищается целиком.
+    """
+    author_ids = list(
+        Follow.objects
+        .filter(user_id=user_id)
+        .exclude(author__pulled_feed__isnull=False)
+        .values_list('author_id', flat=True)
+    )
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    if not rebuild:
+        entries = entries.exclude(post__author_id__in=author_ids)
+    entries.delete()
+    for author_id in author_ids:
+        backfill_timeline(user_id, author_id)
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """Keyset-пагинатор ленты подписок по (pub_date, id поста).
+
+    Сливает страницу материализованной ленты пользователя со свежими
+    постами каждого «популярного» автора из его подписок. Из каждого
+    источника читается не больше per_page + 1 строк, поэтому цена
+    страницы не зависит ни от числа подписчиков автора, ни от глубины.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(
+            TimelineEntry.objects
+            .select_related('post__author', 'post__group')
+            .filter(user=user),
+            per_page,
+        )
+        self.user = user
+
+    @cached_property
+    def pulled_author_ids(self):
+        return list(
+            Follow.objects
+            .filter(user=self.user, author__pulled_feed__isnull=False)
+            .values_list('author_id', flat=True)
+        )
+
+    def _fetch(self, after, descending):
+        timeline = self.keyset_slice(
+            self.object_list, after, descending, key_field='post_id'
+        )
+        sources = [[entry.post for entry in timeline]]
+        for author_id in self.pulled_author_ids:
+            posts = Post.objects.select_related('author', 'group').filter(
+                author_id=author_id
+            )
+            sources.append(list(self.keyset_slice(posts, after, descending)))
+        merged = heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=descending,
+        )
+        return list(islice(_unique(merged), self.per_page + 1))
+
+
+def _unique(posts):
+    """Пропускает повторы: после перевода автора на pull пост мог
+    остаться и в ленте, а в слиянии дубликаты идут подряд."""
+    last_pk = None
+    for post in posts:
+        if post.pk != last_pk:
+            yield post
+        last_pk = post.pk
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import normalize
 from .models import Comment, Post
 
 
@@ -17,6 +19,13 @@ class PostForm(forms.ModelForm):
             'group': 'Группа'
         }
 
+    def clean_image(self):
+        """Новую картинку уменьшает и очищает от EXIF до сохранения."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,72 @@
+"""Приём загруженных картинок постов.
+
+Оригиналы больше settings.POST_IMAGE_MAX_SIDE по длинной стороне
+уменьшаются, а EXIF (геометка, модель камеры, миниатюра) отбрасывается
+после того, как поворот из него применён к пикселям. JPEG сразу
+декодируется в уменьшенном масштабе (draft: DCT-масштабирование в 1/2,
+1/4 или 1/8), крупные остатки сжимаются целым множителем (reduce) и
+только потом точно ресайзятся. Картинки, которые менять не нужно,
+сохраняются как есть, без перекодирования. Анимации (GIF, WebP) не
+уменьшаются, из WebP только удаляется EXIF; MPO (фото телефонов с
+кадром глубины или превью) сохраняется первым кадром как JPEG.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Форматы, где несколько кадров — анимация: кадры сохраняются все.
+ANIMATED_FORMATS = ('GIF', 'WEBP')
+
+
+def _target(size, max_side):
+    width, height = size
+    scale = min(1, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def normalize(upload):
+    """Загруженный файл, уменьшенный и без EXIF, или сам upload."""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    upload.seek(0)
+    image = Image.open(upload)
+    if (image.format in ANIMATED_FORMATS
+            and getattr(image, 'is_animated', False)):
+        return _strip_animated(upload, image)
+    oversized = max(image.size) > max_side
+    # У остальных кадров MPO свой EXIF, поэтому MPO перекодируется всегда.
+    if image.format != 'MPO' and not (oversized or 'exif' in image.info):
+        upload.seek(0)
+        return upload
+
+    format_ = 'JPEG' if image.format == 'MPO' else image.format
+    info = image.info
+    if format_ == 'JPEG':
+        image.draft(image.mode, _target(image.size, max_side))
+    image = ImageOps.exif_transpose(image)
+    factor = max(image.size) // max_side
+    if factor >= 2:
+        image = image.reduce(factor)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    options = {}
+    if format_ == 'JPEG':
+        options['quality'] = settings.POST_IMAGE_QUALITY
+    if info.get('icc_profile'):
+        options['icc_profile'] = info['icc_profile']
+    buffer = BytesIO()
+    image.save(buffer, format_, **options)
+    return ContentFile(buffer.getvalue(), name=upload.name)
+
+
+def _strip_animated(upload, image):
+    """Анимация без EXIF: GIF его не хранит, WebP пересохраняется."""
+    if image.format != 'WEBP' or 'exif' not in image.info:
+        upload.seek(0)
+        return upload
+    buffer = BytesIO()
+    image.save(
+        buffer, 'WEBP', save_all=True, quality=settings.POST_IMAGE_QUALITY
+    )
+    return ContentFile(buffer.getvalue(), name=upload.name)
@@ -0,0 +1,78 @@
+from collections import Counter
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import caching, thumbnails
+from posts.models import Post
+from posts.views import index
+
+STORAGE_CALLS = ('exists', 'size', 'open', 'path')
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает SQL-запросы и обращения к хранилищу файлов при рендере '
+        'первой страницы главной: с поиском превью для каждой карточки '
+        'и одним чтением на страницу.'
+    )
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get(reverse('posts:index'))
+        request.user = AnonymousUser()
+        self.stdout.write(
+            'режим        кэш         запросов   обращений к файлам'
+        )
+        for mode in ('по карточке', 'страницей'):
+            per_card = mode == 'по карточке'
+            cache.clear()
+            cold = self.render(request, per_card)
+            # Карточки и фрагмент ленты рендерятся заново, а записи sorl
+            # уже лежат в кэше.
+            caching.bump(caching.GLOBAL)
+            cache.delete_many(caching.card_keys(
+                Post.objects.all()[:settings.POSTS_COUNT]
+            ))
+            warm = self.render(request, per_card)
+            for state, (queries, calls) in (('холодный', cold),
+                                            ('тёплый', warm)):
+                self.stdout.write(
+                    f'{mode:<12} {state:<10} {queries:>9} {calls:>20}'
+                )
+
+    def render(self, request, per_card):
+        calls = Counter()
+        patches = [
+            mock.patch.object(
+                FileSystemStorage, name, autospec=True,
+                side_effect=self.counting(getattr(FileSystemStorage, name),
+                                          calls, name),
+            )
+            for name in STORAGE_CALLS
+        ]
+        if per_card:
+            patches.append(mock.patch.object(thumbnails, 'prefetch'))
+        for patch in patches:
+            patch.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                index(request)
+        finally:
+            for patch in patches:
+                patch.stop()
+        return len(queries), sum(calls.values())
+
+    @staticmethod
+    def counting(method, calls, name):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return method(*args, **kwargs)
+        return wrapper
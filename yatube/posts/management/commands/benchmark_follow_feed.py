@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.urls import reverse
+
+from posts.feeds import reclassify_authors
+from posts.models import Follow, Post
+from posts.views import follow_index
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p99 follow_index при росте числа подписчиков одного '
+        'автора. Все данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers', nargs='+', type=int,
+            default=[10, 1000, 10000, 100000],
+        )
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--runs', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write('подписчиков      p50, мс     p99, мс')
+        for followers in options['followers']:
+            try:
+                with transaction.atomic():
+                    p50, p99 = self.measure(
+                        followers, options['posts'], options['runs']
+                    )
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(f'{followers:>11} {p50:>12.2f} {p99:>11.2f}')
+
+    def measure(self, followers, posts, runs):
+        author = User.objects.create(username='bench-author')
+        reader = User.objects.create(username='bench-reader')
+        User.objects.bulk_create(
+            User(username=f'bench-{i}') for i in range(followers - 1)
+        )
+        follower_ids = list(
+            User.objects
+            .filter(username__startswith='bench-')
+            .exclude(pk=author.pk)
+            .values_list('pk', flat=True)
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=pk, author=author) for pk in follower_ids
+        )
+        reclassify_authors()
+        for i in range(posts):
+            Post.objects.create(text=f'bench {i}', author=author)
+
+        request = RequestFactory().get(reverse('posts:follow_index'))
+        request.user = reader
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            follow_index(request)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return (
+            timings[len(timings) // 2],
+            timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        )
@@ -0,0 +1,78 @@
+import io
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageOps
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts.models import Post
+from posts.thumbnails import specs, supported_formats, variant_name
+
+
+def _encode(image, geometry, format_):
+    width, height = (int(side) for side in geometry.split('x'))
+    started = time.perf_counter()
+    resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, format_, quality=sorl_settings.THUMBNAIL_QUALITY)
+    return time.perf_counter() - started, buffer.tell()
+
+
+class Command(BaseCommand):
+    help = (
+        'Оценивает адаптивные варианты картинок на выборке: время '
+        'построения и размер каждого варианта против единственного '
+        'JPEG карточки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Файлы картинок (по умолчанию — картинки постов).'
+        )
+        parser.add_argument('--limit', type=int, default=100)
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            post.image.path
+            for post in Post.objects.exclude(image='')[:options['limit']]
+        ]
+        if not paths:
+            self.stdout.write('Нет картинок для замера.')
+            return
+        if 'WEBP' in settings.POST_IMAGE_FORMATS and (
+                'WEBP' not in supported_formats()):
+            self.stdout.write(
+                'Pillow собран без WebP: варианты WEBP пропущены.'
+            )
+        card_geometry = specs()['card'][0]
+        names = [
+            (variant_name(width, format_), format_)
+            for format_ in supported_formats()
+            for width in settings.POST_IMAGE_WIDTHS
+        ]
+        seconds, sizes = defaultdict(float), defaultdict(int)
+        for path in paths:
+            with Image.open(path) as image:
+                image = image.convert('RGB')
+                sizes['card'] += _encode(image, card_geometry, 'JPEG')[1]
+                for name, format_ in names:
+                    spent, size = _encode(image, specs()[name][0], format_)
+                    seconds[name] += spent
+                    sizes[name] += size
+        baseline = sizes['card']
+        self.stdout.write(
+            f'картинок: {len(paths)}, JPEG карточки {card_geometry}: '
+            f'{baseline / len(paths) / 1024:.1f} КБ в среднем'
+        )
+        self.stdout.write(
+            'вариант           мс/картинку    КБ/картинку   экономия'
+        )
+        for name, _ in names:
+            self.stdout.write(
+                f'{name:<17} {seconds[name] * 1000 / len(paths):>11.1f} '
+                f'{sizes[name] / len(paths) / 1024:>14.1f} '
+                f'{1 - sizes[name] / baseline:>10.0%}'
+            )
@@ -0,0 +1,186 @@
+import os
+import re
+import time
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.models import StoredFile
+from core.storage import CONTENT_NAME
+from posts.models import Post
+
+CURSOR_KEY = 'posts:media-gc:cursor'
+# Превью лежат рядом с оригиналом: posts/…/photo.<ключ>.jpg
+# (posts.thumbnails.PrecomputedBackend).
+THUMBNAIL_NAME = re.compile(
+    r'^(?P<stem>.+)\.[0-9a-f]{12}\.(jpg|png|gif|webp)$'
+)
+
+
+def walk(storage, directory, after=''):
+    """(имя, mtime) файлов каталога хранилища по порядку имён.
+
+    Обход начинается после имени after, каталоги, целиком лежащие до
+    него, не читаются.
+    """
+    after_parts = after.split('/') if after else []
+
+    def scan(parts):
+        try:
+            with os.scandir(storage.path('/'.join(parts))) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            path = parts + [entry.name]
+            if entry.is_dir(follow_symlinks=False):
+                if path >= after_parts[:len(path)]:
+                    yield from scan(path)
+            elif path > after_parts:
+                yield '/'.join(path), entry.stat().st_mtime
+
+    return scan(directory.strip('/').split('/'))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки, на которые не ссылается ни один пост, вместе с '
+        'их превью и записями sorl. Хранилище обходится пачками по порядку '
+        'имён, место остановки запоминается в кэше, так что прерванный '
+        'обход продолжается со следующего запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--sleep', type=float, default=0.5,
+            help='Пауза между пачками, секунд.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Файлы моложе стольких секунд не удаляются: пост с ними '
+                 'может быть ещё не сохранён.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать обход сначала.'
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        self.storage = field.storage
+        # Записи sorl старых файлов сделаны под прежним хранилищем.
+        self.legacy_storage = FileSystemStorage()
+        self.dry_run = options['dry_run']
+        if options['restart']:
+            cache.delete(CURSOR_KEY)
+        files = walk(self.storage, field.upload_to, cache.get(CURSOR_KEY, ''))
+        checked = deleted = freed = 0
+        while True:
+            batch = list(islice(files, options['batch_size']))
+            if not batch:
+                break
+            orphans = self.collect(batch, time.time() - options['min_age'])
+            checked += len(batch)
+            deleted += len(orphans)
+            freed += sum(orphans.values())
+            if not self.dry_run:
+                cache.set(CURSOR_KEY, batch[-1][0], None)
+            time.sleep(options['sleep'])
+        if not self.dry_run:
+            cache.delete(CURSOR_KEY)
+        verb = 'Можно удалить' if self.dry_run else 'Удалено'
+        self.stdout.write(
+            f'Проверено файлов: {checked}. {verb}: {deleted} '
+            f'({freed // 1024} КБ)'
+        )
+
+    def collect(self, batch, threshold):
+        """Удаляет сирот из пачки; возвращает имя -> размер удалённых."""
+        names = [name for name, modified in batch if modified < threshold]
+        referenced = set(
+            Post.objects
+            .filter(image__in=names)
+            .values_list('image', flat=True)
+        )
+        candidates = [name for name in names if name not in referenced]
+        orphans = {}
+        # Сначала оригиналы: превью удалённого оригинала тоже сироты.
+        for name in candidates:
+            if not THUMBNAIL_NAME.match(name):
+                self.delete_original(name, threshold, orphans)
+        stems = {}
+        for name in candidates:
+            match = THUMBNAIL_NAME.match(name)
+            if match and not self.has_original(match['stem'], stems):
+                self.delete_thumbnail(name, orphans)
+        return orphans
+
+    def has_original(self, stem, stems):
+        directory = os.path.dirname(stem)
+        if directory not in stems:
+            try:
+                stems[directory] = {
+                    os.path.splitext(name)[0]
+                    for name in os.listdir(self.storage.path(directory))
+                    if not THUMBNAIL_NAME.match(name)
+                }
+            except FileNotFoundError:
+                stems[directory] = set()
+        return os.path.basename(stem) in stems[directory]
+
+    def delete_original(self, name, threshold, orphans):
+        if self.dry_run:
+            size = self.unused_size(name, threshold)
+            if size is not None:
+                orphans[name] = size
+            return
+        # Пока файл проверяется заново и удаляется, загрузка тех же байтов
+        # и release() ждут (ContentAddressedStorage.lock).
+        with self.storage.lock(name):
+            size = self.unused_size(name, threshold)
+            if size is None:
+                return
+            storage = (
+                self.storage if CONTENT_NAME.search(name)
+                else self.legacy_storage
+            )
+            default.kvstore.delete(ImageFile(name, storage))
+            StoredFile.objects.filter(name=name).delete()
+            self.storage.delete(name)
+        orphans[name] = size
+
+    def unused_size(self, name, threshold):
+        """Размер файла name, если он не менялся с threshold и на него не
+        ссылается ни один пост, иначе None."""
+        try:
+            stat = os.stat(self.storage.path(name))
+        except FileNotFoundError:
+            return None
+        # Те же байты могли загрузить снова, пока шла выборка.
+        if stat.st_mtime >= threshold:
+            return None
+        if Post.objects.filter(image=name).exists():
+            return None
+        return stat.st_size
+
+    def delete_thumbnail(self, name, orphans):
+        try:
+            orphans[name] = os.path.getsize(self.storage.path(name))
+        except FileNotFoundError:
+            # Уже удалено вместе с оригиналом.
+            return
+        if self.dry_run:
+            return
+        default.kvstore.delete(
+            ImageFile(name, default.storage), delete_thumbnails=False
+        )
+        default.storage.delete(name)
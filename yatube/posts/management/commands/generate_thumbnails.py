@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts.models import Post
+from posts.thumbnails import generate, get_thumbnail, specs
+
+
+def _generate(post_id):
+    try:
+        generate(post_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие превью картинок постов, например для постов, '
+        'загруженных до фонового построения превью.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS
+        )
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects
+            .exclude(image='')
+            .only('image')
+            .order_by('pk')
+            .iterator()
+        )
+        missing = [
+            post.pk for post in posts
+            if any(
+                get_thumbnail(post.image, name) is None
+                for name in specs()
+            )
+        ]
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(_generate, missing))
+        self.stdout.write(f'Построены превью для постов: {len(missing)}')
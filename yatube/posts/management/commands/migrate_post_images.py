@@ -0,0 +1,82 @@
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import Now
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import CONTENT_NAME, ContentAddressedStorage
+from posts import caching
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище по содержимому. Файлы '
+        'читаются потоково, посты обходятся пачками по pk; уже '
+        'перенесённые пропускаются, поэтому прерванный перенос можно '
+        'просто запустить снова.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help='Не удалять старые файлы и их превью.'
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError(
+                'DEFAULT_FILE_STORAGE — не хранилище по содержимому.'
+            )
+        # Превью старых файлов записаны в sorl под прежним хранилищем.
+        legacy_storage = FileSystemStorage()
+        moved = missing = last_pk = 0
+        while True:
+            batch = list(
+                Post.objects
+                .filter(pk__gt=last_pk)
+                .exclude(image='')
+                .order_by('pk')
+                .values_list('pk', 'image')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            old_names = {
+                name for _, name in batch if not CONTENT_NAME.search(name)
+            }
+            for old_name in sorted(old_names):
+                if not storage.exists(old_name):
+                    missing += 1
+                    continue
+                self.move(storage, legacy_storage, old_name,
+                          options['keep_old'])
+                moved += 1
+        self.stdout.write(
+            f'Перенесено файлов: {moved}, не найдено: {missing}'
+        )
+
+    def move(self, storage, legacy_storage, old_name, keep_old):
+        posts = Post.objects.filter(image=old_name)
+        with storage.open(old_name) as content:
+            new_name = storage.save(old_name, content)
+        with transaction.atomic():
+            affected = list(posts.values_list('pk', 'author_id', 'group_id'))
+            # Одна ссылка уже учтена при сохранении.
+            if len(affected) > 1:
+                storage.add_references(new_name, len(affected) - 1)
+            elif not affected:
+                storage.release(new_name)
+            posts.update(image=new_name, updated_at=Now())
+        scopes = [caching.GLOBAL]
+        for pk, author_id, group_id in affected:
+            scopes += [caching.post_scope(pk), caching.author_scope(author_id)]
+            if group_id is not None:
+                scopes.append(caching.group_scope(group_id))
+        caching.bump(*scopes)
+        if not keep_old:
+            default.kvstore.delete(ImageFile(old_name, legacy_storage))
+            storage.delete(old_name)
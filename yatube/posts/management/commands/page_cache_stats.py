@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.caching import page_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша страниц для анонимов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        stats = page_stats(reset=options['reset'])
+        total = stats['hit'] + stats['miss']
+        ratio = stats['hit'] / total if total else 0
+        self.stdout.write(
+            f"Попаданий: {stats['hit']}, промахов: {stats['miss']}, "
+            f'доля попаданий: {ratio:.1%}'
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс постов. Посты переиндексируются '
+        'пачками по id, каждая в своей транзакции, так что поиск работает '
+        'и во время перестройки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk = options['batch_size']
+        last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        for first_pk in range(1, last_pk + 1, chunk):
+            search.rebuild(first_pk, first_pk + chunk - 1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {search.TABLE} WHERE rowid > %s', [last_pk]
+            )
+            # Сливает сегменты индекса после массовой записи.
+            cursor.execute(
+                f"INSERT INTO {search.TABLE} ({search.TABLE}) "
+                f"VALUES ('optimize')"
+            )
+        self.stdout.write(f'Проиндексировано постов: {Post.objects.count()}')
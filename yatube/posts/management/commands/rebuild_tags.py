@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import tags
+from posts.counters import reconcile_tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново выделяет хештеги и упоминания из текстов постов (например, '
+        'после правок через queryset.update) и пересчитывает число постов '
+        'у тегов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        last_pk = indexed = 0
+        while True:
+            batch = list(
+                Post.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('text', 'pub_date')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            with transaction.atomic():
+                for post in batch:
+                    tags.sync(post)
+            indexed += len(batch)
+        self.stdout.write(
+            f'Просмотрено постов: {indexed}, '
+            f'исправлено счётчиков тегов: {reconcile_tags()}'
+        )
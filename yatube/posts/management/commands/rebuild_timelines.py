@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feeds import reclassify_authors, repair_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает или чинит материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пользователи, чьи ленты обработать (по умолчанию все).'
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Очистить ленту перед заполнением, а не только починить.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            reclassify_authors()
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        processed = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            with transaction.atomic():
+                repair_timeline(user_id, rebuild=options['rebuild'])
+            processed += 1
+        self.stdout.write(f'Обработано лент: {processed}')
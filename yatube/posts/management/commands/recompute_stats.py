@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.caching import recompute_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает пересчёты фрагментов лент и числа постов: сделанные '
+        'и объединённые с чужим пересчётом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        stats = recompute_stats(reset=options['reset'])
+        self.stdout.write(
+            f"Пересчётов: {stats['recomputed']}, "
+            f"заранее: {stats['early']}, "
+            f"объединено: {stats['coalesced']}"
+        )
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts.counters import reconcile_authors, reconcile_posts
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с данными и чинит расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк пересчитывать за одну транзакцию.'
+        )
+
+    def handle(self, *args, **options):
+        chunk = options['chunk_size']
+        for model, reconcile in (
+            (User, reconcile_authors),
+            (Post, reconcile_posts),
+        ):
+            last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+            repaired = 0
+            for first_pk in range(1, last_pk + 1, chunk):
+                with transaction.atomic():
+                    repaired += reconcile(first_pk, first_pk + chunk - 1)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: исправлено {repaired}'
+            )
@@ -0,0 +1,45 @@
+from django.utils.cache import get_conditional_response
+
+from . import caching
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для анонимных читателей.
+
+    Кэшируются только успешные GET-ответы страниц, помеченных
+    surrogate-ключами (caching.tag_request). Запись в пост, группу,
+    комментарии или подписки увеличивает поколения своих ключей, и
+    затронутые страницы перестают отдаваться из кэша. Заголовок
+    X-Page-Cache показывает HIT или MISS, а счётчики — команда
+    page_cache_stats.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return self.get_response(request)
+        url = request.build_absolute_uri()
+        response = caching.get_page(url)
+        if response is not None:
+            caching.count_page('hit')
+            response['X-Page-Cache'] = 'HIT'
+            return get_conditional_response(
+                request, etag=response.get('ETag'), response=response
+            )
+
+        response = self.get_response(request)
+        generations = getattr(request, 'surrogate_keys', None)
+        if not generations:
+            return response
+        caching.count_page('miss')
+        response['Surrogate-Key'] = ' '.join(generations)
+        if (request.method == 'GET'
+                and response.status_code == 200
+                and not response.streaming
+                and not response.cookies):
+            response['X-Page-Cache'] = 'MISS'
+            caching.set_page(url, response, generations)
+        return response
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-17 00:22
+
+from django.core.files.images import get_image_dimensions
+from django.db import migrations, models
+
+
+def fill_dimensions(apps, schema_editor):
+    """Размеры уже загруженных картинок: читается только заголовок файла."""
+    Post = apps.get_model('posts', 'Post')
+    storage = Post._meta.get_field('image').storage
+    posts = (
+        Post.objects
+        .exclude(image='')
+        .filter(image_width__isnull=True)
+        .values_list('pk', 'image')
+    )
+    for pk, name in posts.iterator():
+        try:
+            with storage.open(name) as image:
+                width, height = get_image_dimensions(image)
+        except OSError:
+            continue
+        if width is not None:
+            Post.objects.filter(pk=pk).update(
+                image_width=width, image_height=height
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.RunPython(fill_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+NORMALIZE = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+
+FORWARD = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, tokenize = 'unicode61 remove_diacritics 0')",
+    "INSERT INTO posts_post_fts (rowid, text) "
+    f"SELECT id, {NORMALIZE.format('text')} FROM posts_post",
+    "CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts (rowid, text) "
+    f"VALUES (new.id, {NORMALIZE.format('new.text')}); END",
+    "CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF text "
+    "ON posts_post BEGIN "
+    "DELETE FROM posts_post_fts WHERE rowid = old.id; "
+    "INSERT INTO posts_post_fts (rowid, text) "
+    f"VALUES (new.id, {NORMALIZE.format('new.text')}); END",
+    "CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN "
+    "DELETE FROM posts_post_fts WHERE rowid = old.id; END",
+]
+
+BACKWARD = [
+    'DROP TRIGGER posts_post_fts_delete',
+    'DROP TRIGGER posts_post_fts_update',
+    'DROP TRIGGER posts_post_fts_insert',
+    'DROP TABLE posts_post_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
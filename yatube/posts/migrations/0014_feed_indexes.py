@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-17 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_tags'),
+    ]
+
+    operations = [
+        # Индекс по одному pub_date — префикс post_date_id_idx. AlterField
+        # пересоздал бы таблицу в SQLite вместе с потерей триггеров
+        # полнотекстового индекса (0012), поэтому индекс удаляется SQL.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX posts_post_pub_date_131c7f8d',
+                    'CREATE INDEX posts_post_pub_date_131c7f8d '
+                    'ON posts_post (pub_date)',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='post',
+                    name='pub_date',
+                    field=models.DateTimeField(auto_now_add=True, verbose_name='Дата публикации'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', 'author'], name='follow_user_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_date_id_idx'),
+        ),
+    ]
@@ -39,8 +39,11 @@ class Post(models.Model):
     )
     pub_date = models.DateTimeField(
         'Дата публикации',
-        auto_now_add=True,
-        db_index=True
+        auto_now_add=True
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
     )
     author = models.ForeignKey(
         User,
@@ -63,13 +66,54 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    comment_count = models.IntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        # Ленты читаются keyset-курсором по (pub_date, id) от новых к
+        # старым: индекс отдаёт страницу без сортировки
+        # (posts/tests/test_indexes.py).
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_id_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_id_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Счётчик меняется только через F() (см. posts.counters), поэтому
+        # при обычном сохранении не затираем его устаревшим значением.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comment_count'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     objects = None
@@ -98,6 +142,11 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_id_idx')
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -123,6 +172,168 @@ class Follow(models.Model):
                 fields=['author', 'user'],
                 name='unique_follower')
         ]
+        # Подписки пользователя; подписчики автора читаются по
+        # unique_follower.
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='follow_user_author_idx')
+        ]
 
     def __str__(self):
         return f'{self.author}, follower:{self.user}'
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя (см. posts.counters)."""
+    objects = None
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    post_count = models.IntegerField('Число постов', default=0)
+    follower_count = models.IntegerField('Число подписчиков', default=0)
+    following_count = models.IntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у подписчика.
+
+    Заполняется при публикации поста (fan-out on write) и при подписке,
+    чистится при отписке; лента читается одним диапазоном индекса.
+    """
+    objects = None
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_post_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.post}'
+
+
+class PulledAuthor(models.Model):
+    """Автор с большим числом подписчиков.
+
+    Его посты не раскладываются по лентам подписчиков, а подмешиваются
+    в ленту при чтении (см. posts.feeds).
+    """
+    objects = None
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='pulled_feed',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Автор с лентой по запросу'
+        verbose_name_plural = 'Авторы с лентой по запросу'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class Tag(models.Model):
+    """Хештег или упоминание с числом постов, где оно встречается.
+
+    post_count меняется вместе с PostTag (см. posts.tags), поэтому
+    популярные теги выбираются по индексу без агрегатных запросов.
+    """
+    HASHTAG = '#'
+    MENTION = '@'
+    KINDS = (
+        (HASHTAG, 'Хештег'),
+        (MENTION, 'Упоминание'),
+    )
+    objects = None
+    kind = models.CharField('Вид', max_length=1, choices=KINDS)
+    name = models.CharField('Имя', max_length=150)
+    post_count = models.IntegerField('Число постов', default=0)
+
+    class Meta:
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'name'],
+                name='unique_tag')
+        ]
+        indexes = [
+            models.Index(
+                fields=['kind', '-post_count', 'name'],
+                name='tag_kind_post_count_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.kind}{self.name}'
+
+
+class PostTag(models.Model):
+    """Тег в посте; страница тега читается одним диапазоном индекса."""
+    objects = None
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='entries',
+        verbose_name='Тег'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tag_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Тег поста'
+        verbose_name_plural = 'Теги постов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'post'],
+                name='unique_post_tag')
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', '-pub_date', '-post'],
+                name='post_tag_date_post_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.tag}: {self.post}'
@@ -0,0 +1,140 @@
+"""Полнотекстовый поиск по постам (SQLite FTS5).
+
+Тексты постов лежат в таблице posts_post_fts, которую триггеры
+(миграция 0012) обновляют при любой записи в posts_post, включая
+queryset.update(). Токенизатор unicode61 приводит кириллицу к нижнему
+регистру, «ё» заменяется на «е» и в индексе, и в запросе. Морфология
+учитывается при запросе: от каждого слова отрезается окончание, а
+основа ищется как префикс («котами» -> кот*). Результаты упорядочены по
+bm25, страницы листаются keyset-курсором по (оценка, id).
+"""
+import re
+
+from django.db import connection, transaction
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import Post
+from .utils import NEXT, PREVIOUS, CursorPaginator
+
+TABLE = 'posts_post_fts'
+# Больше слов в запросе не учитывается.
+MAX_TERMS = 8
+MIN_STEM = 3
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'[а-я]')
+REFLEXIVE = ('ся', 'сь')
+# Окончания существительных, прилагательных и глаголов, длинные первыми.
+ENDINGS = sorted(
+    (
+        'иями ями ами ией иям ием иях ов ев ей ой ий ям ем ам ом ах ях ию '
+        'ью ия ья ие ье еи ии ими ыми его ого ему ому ее ые ое ый ая яя ую '
+        'юю ою ею их ых им ым ешь ете ет ут ют ишь ите ит ат ят ила ыла ли '
+        'ло ла ть ти ил ыл а е и й о у ы ь ю я'
+    ).split(),
+    key=len,
+    reverse=True,
+)
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def stem(word):
+    """Основа русского слова: без возвратной частицы и окончания."""
+    if not CYRILLIC.search(word):
+        return word
+    for suffix in REFLEXIVE:
+        if word.endswith(suffix) and len(word) - 2 >= MIN_STEM:
+            word = word[:-2]
+            break
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательской строки или '' если искать нечего."""
+    terms = WORD.findall(normalize(query))[:MAX_TERMS]
+    return ' '.join(f'"{stem(term)}"*' for term in terms)
+
+
+def matching_ids(expression):
+    """Подзапрос id постов, подходящих под выражение match_expression."""
+    return (
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [expression]
+    )
+
+
+def rebuild(first_pk, last_pk):
+    """Переиндексирует посты с id в [first_pk, last_pk] одной транзакцией."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid BETWEEN %s AND %s',
+            [first_pk, last_pk],
+        )
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, text) "
+            f"SELECT id, replace(replace(text, 'ё', 'е'), 'Ё', 'Е') "
+            f"FROM posts_post WHERE id BETWEEN %s AND %s",
+            [first_pk, last_pk],
+        )
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска от лучших к худшим по (bm25, id).
+
+    bm25 в SQLite отрицательна и тем меньше, чем лучше совпадение.
+    """
+
+    newest_first = False
+
+    def __init__(self, query, per_page):
+        super().__init__(Post.objects.none(), per_page)
+        self.expression = match_expression(query)
+
+    def parse_cursor(self, token):
+        try:
+            direction, score, pk = (
+                urlsafe_base64_decode(token).decode().split('|')
+            )
+            score, pk = float(score), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        return direction, score, pk
+
+    def _cursor_for(self, direction, post):
+        raw = f'{direction}|{post.search_rank!r}|{post.pk}'
+        return urlsafe_base64_encode(force_bytes(raw))
+
+    def _fetch(self, after, descending):
+        if not self.expression:
+            return []
+        sql = (
+            f'SELECT rowid, bm25({TABLE}) AS score FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s'
+        )
+        params = [self.expression]
+        sign, order = ('<', 'DESC') if descending else ('>', 'ASC')
+        if after is not None:
+            sql += (
+                f' AND (score {sign} %s OR (score = %s AND rowid {sign} %s))'
+            )
+            params += [after[0], after[0], after[1]]
+        sql += f' ORDER BY score {order}, rowid {order} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ranks = dict(cursor.fetchall())
+        posts = Post.objects.select_related('author', 'group').in_bulk(ranks)
+        rows = []
+        for pk, score in ranks.items():
+            if pk in posts:
+                posts[pk].search_rank = score
+                rows.append(posts[pk])
+        return rows
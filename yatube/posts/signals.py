@@ -0,0 +1,141 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import caching, counters, feeds, tags, thumbnails
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def on_user_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя меняет только last_login, которого нет на
+    # страницах.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    caching.bump(
+        caching.author_scope(instance.pk),
+        caching.author_card_scope(instance.pk),
+    )
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    instance._previous_text = None
+    # Новая загрузка добавит ссылку на файл, даже если его байты те же,
+    # что у прежней картинки, и имя не изменится.
+    instance._image_uploaded = (
+        bool(instance.image) and not instance.image._committed
+    )
+    if not instance._state.adding:
+        (instance._previous_group_id, instance._previous_image,
+         instance._previous_text) = (
+            Post.objects
+            .filter(pk=instance.pk)
+            .values_list('group_id', 'image', 'text')
+            .first()
+        ) or (None, '', None)
+    if instance.image.name != instance._previous_image:
+        # Размеры новой картинки шаблоны ставят в <img> без чтения файла.
+        # Берутся из ещё не сохранённой загрузки, уже лежащие файлы не
+        # открываются.
+        instance.image_width = instance.image_height = None
+        if instance.image and not instance.image._committed:
+            instance.image_width = instance.image.width
+            instance.image_height = instance.image.height
+
+
+@receiver(post_save, sender=Post)
+def on_post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_author(instance.author_id, post_count=1)
+        feeds.fan_out_post(instance)
+    if instance.text != getattr(instance, '_previous_text', None):
+        tags.sync(instance)
+    previous_image = getattr(instance, '_previous_image', '')
+    if instance.image.name != previous_image:
+        if instance.image:
+            thumbnails.schedule(instance.pk, new_image=True)
+        thumbnails.release_image(previous_image)
+    elif getattr(instance, '_image_uploaded', False):
+        thumbnails.release_image(previous_image)
+    caching.bump(*caching.post_scopes(
+        instance, getattr(instance, '_previous_group_id', None)
+    ))
+
+
+@receiver(pre_delete, sender=Post)
+def on_post_deleting(sender, instance, **kwargs):
+    tags.release(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def on_post_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, post_count=-1)
+    thumbnails.release_image(instance.image.name)
+    caching.bump(*caching.post_scopes(instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def on_group_changed(sender, instance, **kwargs):
+    caching.bump(
+        caching.GLOBAL,
+        caching.group_scope(instance.pk),
+        caching.group_card_scope(instance.pk),
+    )
+
+
+@receiver(pre_delete, sender=Group)
+def on_group_deleting(sender, instance, **kwargs):
+    # Посты группы получат group=NULL обычным UPDATE без сигналов, а их
+    # карточки лежат и в лентах авторов.
+    author_ids = instance.posts.values_list('author_id', flat=True).distinct()
+    caching.bump(*(caching.author_scope(pk) for pk in author_ids))
+
+
+@receiver(post_save, sender=Comment)
+def on_comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+        caching.bump(caching.post_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def on_comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    caching.bump(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def on_follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_author(instance.author_id, follower_count=1)
+        counters.bump_author(instance.user_id, following_count=1)
+        feeds.on_follow(instance.user_id, instance.author_id)
+        caching.bump(
+            caching.author_scope(instance.author_id),
+            caching.author_scope(instance.user_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def on_follow_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, follower_count=-1)
+    counters.bump_author(instance.user_id, following_count=-1)
+    feeds.prune_timeline(instance.user_id, instance.author_id)
+    caching.bump(
+        caching.author_scope(instance.author_id),
+        caching.author_scope(instance.user_id),
+    )
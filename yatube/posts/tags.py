@@ -0,0 +1,158 @@
+"""Хештеги и упоминания в текстах постов.
+
+#теги и @упоминания выделяются из текста при сохранении поста и
+раскладываются в PostTag (тег, пост, дата публикации), а Tag.post_count
+сдвигается атомарными UPDATE, как счётчики в posts.counters. Страница
+тега читается keyset-курсором по индексу PostTag, а виджет популярных
+тегов — по индексу Tag.post_count, без сканирования текстов и агрегатов.
+Расхождения после правок в обход сигналов чинит команда rebuild_tags.
+"""
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from core.routers import cache_timeout
+
+from . import caching
+from .models import PostTag, Tag
+from .utils import CursorPaginator
+
+# «&#123;» — не хештег, «mail@host» — не упоминание.
+HASHTAG = r'(?<![\w&#])#(\w*[^\W\d_]\w*)'
+MENTION = r'(?<![\w@.])@(\w[\w.+-]*\w|\w)'
+TOKEN = re.compile(f'{HASHTAG}|{MENTION}')
+POPULAR_KEY = 'posts:popular-tags:{generation}'
+URL_NAMES = {Tag.HASHTAG: 'posts:tag', Tag.MENTION: 'posts:mention'}
+
+
+def extract(text):
+    """Множество (вид, имя) хештегов и упоминаний текста."""
+    max_length = Tag._meta.get_field('name').max_length
+    found = set()
+    for hashtag, mention in TOKEN.findall(text):
+        kind = Tag.HASHTAG if hashtag else Tag.MENTION
+        name = (hashtag or mention).lower()
+        if len(name) <= max_length:
+            found.add((kind, name))
+    return found
+
+
+def _tag_ids(keys):
+    """id тегов для ключей (вид, имя); недостающие теги создаются."""
+    names = {name for _, name in keys}
+
+    def existing():
+        return {
+            (kind, name): pk
+            for pk, kind, name in Tag.objects
+            .filter(name__in=names)
+            .values_list('pk', 'kind', 'name')
+            if (kind, name) in keys
+        }
+
+    ids = existing()
+    missing = keys - ids.keys()
+    if missing:
+        Tag.objects.bulk_create(
+            [Tag(kind=kind, name=name) for kind, name in missing],
+            ignore_conflicts=True,
+        )
+        ids = existing()
+    return ids
+
+
+def sync(post):
+    """Приводит теги поста в соответствие с его текстом."""
+    wanted = extract(post.text)
+    current = {
+        (kind, name): pk
+        for pk, kind, name in PostTag.objects
+        .filter(post=post)
+        .values_list('tag_id', 'tag__kind', 'tag__name')
+    }
+    removed = [pk for key, pk in current.items() if key not in wanted]
+    added = wanted - current.keys()
+    with transaction.atomic():
+        if removed:
+            PostTag.objects.filter(post=post, tag_id__in=removed).delete()
+            Tag.objects.filter(pk__in=removed).update(
+                post_count=F('post_count') - 1
+            )
+        if added:
+            tag_ids = list(_tag_ids(added).values())
+            PostTag.objects.bulk_create(
+                [
+                    PostTag(tag_id=pk, post=post, pub_date=post.pub_date)
+                    for pk in tag_ids
+                ],
+                ignore_conflicts=True,
+            )
+            Tag.objects.filter(pk__in=tag_ids).update(
+                post_count=F('post_count') + 1
+            )
+
+
+def release(post_id):
+    """Перед удалением поста: его PostTag уйдут каскадом."""
+    Tag.objects.filter(entries__post_id=post_id).update(
+        post_count=F('post_count') - 1
+    )
+
+
+def popular():
+    """Самые частые хештеги; список меняется с поколением главной."""
+    key = POPULAR_KEY.format(generation=caching.generation(caching.GLOBAL))
+    tags = cache.get(key)
+    if tags is None:
+        tags = list(
+            Tag.objects
+            .filter(kind=Tag.HASHTAG, post_count__gt=0)
+            .order_by('-post_count', 'name')[:settings.POPULAR_TAGS_COUNT]
+        )
+        cache.set(
+            key, tags, cache_timeout(settings.OBJECT_CACHE_TIMEOUT)
+        )
+    return tags
+
+
+def link_tags(text):
+    """Экранированный текст со ссылками на страницы тегов."""
+    parts = []
+    position = 0
+    for match in TOKEN.finditer(text):
+        hashtag, mention = match.groups()
+        kind = Tag.HASHTAG if hashtag else Tag.MENTION
+        parts.append(conditional_escape(text[position:match.start()]))
+        parts.append(format_html(
+            '<a href="{}">{}</a>',
+            reverse(URL_NAMES[kind], args=[(hashtag or mention).lower()]),
+            match.group(),
+        ))
+        position = match.end()
+    parts.append(conditional_escape(text[position:]))
+    return mark_safe(''.join(parts))
+
+
+class TagPaginator(CursorPaginator):
+    """Посты тега по (pub_date, id поста) из индекса PostTag."""
+
+    def __init__(self, tag, per_page):
+        super().__init__(
+            PostTag.objects
+            .select_related('post__author', 'post__group')
+            .filter(tag=tag)
+            .order_by('-pub_date', '-post_id'),
+            per_page,
+        )
+
+    def _fetch(self, after, descending):
+        entries = self.keyset_slice(
+            self.object_list, after, descending, key_field='post_id'
+        )
+        return [entry.post for entry in entries]
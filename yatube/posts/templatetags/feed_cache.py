@@ -0,0 +1,84 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from posts import caching, thumbnails
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, owner, vary_on):
+        self.nodelist = nodelist
+        self.owner = owner
+        self.vary_on = vary_on
+
+    def render(self, context):
+        scope = caching.scope_of(self.owner.resolve(context))
+        key = make_template_fragment_key(
+            f'feed:{scope}', [var.resolve(context) for var in self.vary_on]
+        )
+        return caching.cached_recompute(
+            key,
+            lambda: self.nodelist.render(context),
+            settings.FEED_CACHE_TIMEOUT,
+            caching.generation(scope),
+        )
+
+
+@register.tag
+def feedcache(parser, token):
+    """Кэширует фрагмент ленты до следующей записи в неё.
+
+    {% feedcache group page_obj.number page_obj.cursor %} ...
+    {% endfeedcache %}
+
+    Первый аргумент — владелец ленты: группа, автор или строка для
+    главной страницы; остальные — от чего ещё зависит фрагмент.
+    Пока один запрос перерисовывает фрагмент с истёкшим сроком,
+    параллельные получают прежний; после записи в ленту прежний не
+    отдаётся (caching.cached_recompute).
+    """
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 1 argument."
+        )
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
+
+
+@register.simple_tag
+def post_cards(posts):
+    """HTML карточек постов страницы с кэшем на каждую карточку.
+
+    {% post_cards page_obj as cards %}
+    {% for card in cards %}{{ card }}{% endfor %}
+
+    Все карточки читаются одним cache.get_many, рендерятся только
+    промахи, а превью для них находятся одним чтением. Ключ включает
+    updated_at поста, так что одна и та же карточка годится для любой
+    ленты, пока не изменились пост, его автор и группа
+    (caching.card_keys).
+    """
+    keys = dict(zip(caching.card_keys(posts), posts))
+    cards = cache.get_many(keys)
+    missed = {}
+    card_template = get_template('includes/post_card.html')
+    thumbnails.prefetch(
+        [post for key, post in keys.items() if key not in cards]
+    )
+    for key, post in keys.items():
+        if key not in cards:
+            missed[key] = cards[key] = card_template.render({'post': post})
+    if missed:
+        cache.set_many(missed, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
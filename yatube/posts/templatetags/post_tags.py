@@ -0,0 +1,14 @@
+from django import template
+
+from posts import tags
+
+register = template.Library()
+
+
+@register.filter(is_safe=True)
+def link_tags(text):
+    """Текст поста со ссылками на страницы #тегов и @упоминаний.
+
+    {{ post.text|link_tags }}
+    """
+    return tags.link_tags(text)
@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+def _lookup(post, name):
+    prefetched = getattr(post, 'thumbnails', {})
+    if name in prefetched:
+        return prefetched[name]
+    return thumbnails.get_thumbnail(post.image, name)
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post):
+    """Картинка поста: <picture> с вариантами по ширине и формату.
+
+    Браузер выбирает первый поддерживаемый формат (WebP раньше JPEG) и
+    ширину под экран; <img> с превью карточки остаётся запасным.
+    """
+    context = {'post': post, 'image': None, 'sources': []}
+    if not post.image:
+        return context
+    context['image'] = _lookup(post, thumbnails.CARD)
+    missing = context['image'] is None
+    for format_ in thumbnails.supported_formats():
+        variants = [
+            _lookup(post, thumbnails.variant_name(width, format_))
+            for width in settings.POST_IMAGE_WIDTHS
+        ]
+        if None in variants:
+            missing = True
+            continue
+        context['sources'].append({
+            'type': thumbnails.MIME_TYPES[format_],
+            'srcset': ', '.join(
+                f'{variant.url} {variant.width}w' for variant in variants
+            ),
+        })
+    if missing:
+        thumbnails.schedule(post.pk)
+    return context
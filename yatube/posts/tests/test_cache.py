@@ -0,0 +1,210 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import SQLiteCache, TwoTierCache
+
+from .. import caching
+from ..models import Post
+
+User = get_user_model()
+
+
+def _increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def test_values_are_shared_between_instances(self):
+        """Запись одного процесса видна другому: у них общий файл."""
+        other = SQLiteCache(self.path, {})
+        self.cache.set('post', {'text': 'Текст'})
+        self.assertEqual(other.get('post'), {'text': 'Текст'})
+        other.delete('post')
+        self.assertIsNone(self.cache.get('post'))
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set('key', 'value', timeout=0.05)
+        self.assertTrue(self.cache.add('other', 1))
+        self.assertFalse(self.cache.add('other', 2))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_cull_drops_least_recently_read(self):
+        cache = SQLiteCache(
+            self.path, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}}
+        )
+        cache.cull_check_interval = 1
+        cache.touch_resolution = 0
+        cache.set_many({f'key{i}': i for i in range(10)})
+        cache.get_many([f'key{i}' for i in range(5, 10)])
+        cache.set('key10', 10)
+        self.assertEqual(
+            cache.get_many([f'key{i}' for i in range(11)]),
+            {f'key{i}': i for i in range(5, 11)},
+        )
+
+
+class TestCacheIsolationTest(SimpleTestCase):
+    def test_tests_do_not_use_development_cache_file(self):
+        """Тесты пишут не в cache.sqlite3 сервера разработки."""
+        path = caches['shared']._path
+        self.assertNotEqual(
+            path, os.path.join(settings.BASE_DIR, 'cache.sqlite3')
+        )
+        self.assertTrue(path.startswith(tempfile.gettempdir()))
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = SQLiteCache(os.path.join(directory.name, 'cache.sqlite3'), {})
+        patcher = mock.patch.object(TwoTierCache, 'shared', shared)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shared = shared
+        self.cache = TwoTierCache(directory.name, {
+            'OPTIONS': {'MAX_ENTRIES': 2, 'LOCAL_TIMEOUT': 0.1},
+        })
+
+    def test_reads_are_served_from_process_memory(self):
+        self.cache.set('key', 'value')
+        self.shared.delete('key')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_other_process_writes_are_seen_after_local_timeout(self):
+        self.cache.set('generation', 1)
+        self.shared.incr('generation')
+        self.assertEqual(self.cache.get('generation'), 1)
+        time.sleep(0.15)
+        self.assertEqual(self.cache.get('generation'), 2)
+
+    def test_own_writes_are_seen_immediately(self):
+        self.cache.set('generation', 1)
+        self.cache.incr('generation')
+        self.assertEqual(self.cache.get('generation'), 2)
+        self.cache.delete('generation')
+        self.assertIsNone(self.cache.get('generation'))
+
+    def test_local_tier_is_bounded(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.shared.clear()
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3}
+        )
+
+
+class CachedRecomputeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.recompute_stats(reset=True)
+
+    def test_stale_value_is_served_while_other_process_recomputes(self):
+        # Срок записи истёк, а версия та же.
+        cache.set('fragment', ('old', 1, 0.01, time.time() - 1))
+        cache.add(caching.LOCK_KEY.format(key='fragment'), 1)
+        compute = mock.Mock(return_value='new')
+        value = caching.cached_recompute('fragment', compute, 60, version=1)
+        self.assertEqual(value, 'old')
+        compute.assert_not_called()
+        self.assertEqual(caching.recompute_stats()['coalesced'], 1)
+
+    @override_settings(CACHE_LOCK_WAIT=0.1)
+    def test_value_of_old_version_is_not_served(self):
+        caching.cached_recompute('fragment', lambda: 'old', 60, version=1)
+        cache.add(caching.LOCK_KEY.format(key='fragment'), 1)
+        value = caching.cached_recompute(
+            'fragment', lambda: 'new', 60, version=2
+        )
+        self.assertEqual(value, 'new')
+
+    @override_settings(CACHE_LOCK_WAIT=0.1)
+    def test_page_is_fresh_after_write_while_fragment_is_locked(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Старый пост', author=author)
+        client = Client()
+        client.get(reverse('posts:index'))
+        Post.objects.create(text='Новый пост', author=author)
+        # Фрагмент ленты пересчитывает другой процесс.
+        with mock.patch('posts.caching._lock', return_value=False):
+            first = client.get(reverse('posts:index'))
+            second = client.get(reverse('posts:index'))
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        for response in (first, second):
+            self.assertContains(response, 'Новый пост')
+        response = client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=first['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_lock_holder_recomputes_and_releases(self):
+        caching.cached_recompute('fragment', lambda: 'old', 60, version=1)
+        value = caching.cached_recompute(
+            'fragment', lambda: 'new', 60, version=2
+        )
+        self.assertEqual(value, 'new')
+        self.assertIsNone(cache.get(caching.LOCK_KEY.format(key='fragment')))
+        self.assertEqual(caching.recompute_stats()['recomputed'], 2)
+
+    def test_slow_values_are_recomputed_early(self):
+        # Значение считалось 100 секунд, до срока осталась минута.
+        cache.set('fragment', ('old', 1, 100, time.time() + 60))
+        with mock.patch('posts.caching.random.random', return_value=0.9):
+            value = caching.cached_recompute(
+                'fragment', lambda: 'new', 60, version=1
+            )
+        self.assertEqual(value, 'new')
+        self.assertEqual(caching.recompute_stats()['early'], 1)
+
+    def test_page_count_is_cached_until_feed_changes(self):
+        user = User.objects.create_user(username='reader')
+        Post.objects.create(text='Пост', author=user)
+        client = Client()
+        client.force_login(user)
+        url = reverse('posts:index') + '?page=1'
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            return sum('COUNT(' in query['sql'] for query in queries)
+
+        self.assertEqual(count_queries(), 1)
+        self.assertEqual(count_queries(), 0)
+        Post.objects.create(text='Ещё пост', author=user)
+        self.assertEqual(count_queries(), 1)
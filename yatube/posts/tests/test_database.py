@@ -0,0 +1,107 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase
+
+from ..models import Post
+
+User = get_user_model()
+
+
+class SQLiteTuningTest(TestCase):
+    def test_new_connection_gets_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(directory, 'db.sqlite3'),
+            })
+            try:
+                with wrapper.cursor() as cursor:
+                    values = {}
+                    for name in settings.SQLITE_PRAGMAS:
+                        cursor.execute(f'PRAGMA {name}')
+                        values[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(values['journal_mode'], 'wal')
+        # synchronous=NORMAL
+        self.assertEqual(values['synchronous'], 1)
+        for name in ('mmap_size', 'cache_size', 'busy_timeout'):
+            self.assertEqual(values[name], settings.SQLITE_PRAGMAS[name])
+
+    def test_optimize_database_collects_statistics(self):
+        Post.objects.create(
+            text='Пост', author=User.objects.create_user(username='author')
+        )
+        stdout = StringIO()
+        call_command('optimize_database', analyze=True, stdout=stdout)
+        self.assertIn('sqlite_stat1', stdout.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM sqlite_stat1 WHERE tbl = %s',
+                [Post._meta.db_table],
+            )
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_optimize_database_without_statistics(self):
+        """На базе, где ANALYZE ещё не было, статистика собирается."""
+        Post.objects.create(
+            text='Пост', author=User.objects.create_user(username='author')
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS sqlite_stat1')
+        stdout = StringIO()
+        call_command('optimize_database', stdout=stdout)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM sqlite_stat1 WHERE tbl = %s',
+                [Post._meta.db_table],
+            )
+            self.assertGreater(cursor.fetchone()[0], 0)
+        call_command('optimize_database', stdout=stdout)
+        self.assertIn('sqlite_stat1', stdout.getvalue())
+
+    def test_optimize_database_refreshes_stale_statistics(self):
+        """Статистика, собранная на почти пустой таблице, обновляется.
+
+        Команда работает в новом соединении, которое таблицу ещё не
+        читало, как и при запуске по расписанию.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(directory, 'db.sqlite3'),
+            }, alias='stale')
+            with wrapper.cursor() as cursor:
+                cursor.execute('CREATE TABLE post (id INTEGER PRIMARY KEY)')
+                cursor.execute('CREATE INDEX post_id ON post (id DESC)')
+                cursor.execute('INSERT INTO post VALUES (1)')
+                cursor.execute('ANALYZE')
+                cursor.execute(
+                    'WITH RECURSIVE n(id) AS '
+                    '(SELECT 2 UNION ALL SELECT id + 1 FROM n WHERE id < 5000)'
+                    ' INSERT INTO post SELECT id FROM n'
+                )
+            wrapper.close()
+            command = 'core.management.commands.optimize_database.connections'
+            try:
+                with mock.patch(command, {'stale': wrapper}):
+                    call_command(
+                        'optimize_database', database='stale',
+                        stdout=StringIO(),
+                    )
+                with wrapper.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT stat FROM sqlite_stat1 WHERE tbl = 'post'"
+                    )
+                    stat = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertGreater(int(stat.split()[0]), 1)
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -23,6 +24,8 @@ SMALL_GIF = (
     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
     b'\x0A\x00\x3B'
 )
+# Загрузки хранятся по хешу содержимого (core.storage).
+SMALL_GIF_DIGEST = hashlib.sha256(SMALL_GIF).hexdigest()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -110,7 +113,10 @@ class PostFormTest(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text='Текстовый текст',
-                image='posts/small_for_create.gif'
+                image='posts/{0}/{1}/{2}.gif'.format(
+                    SMALL_GIF_DIGEST[:2], SMALL_GIF_DIGEST[2:4],
+                    SMALL_GIF_DIGEST
+                )
             ).exists()
         )
 
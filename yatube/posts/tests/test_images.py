@@ -0,0 +1,153 @@
+import shutil
+import struct
+import tempfile
+from io import BytesIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, features
+
+from ..images import normalize
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def photo(width, height, orientation=None):
+    """JPEG заданного размера, с EXIF-поворотом, если он указан."""
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера'
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(
+        buffer, 'JPEG', exif=exif.tobytes()
+    )
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+def mpo(width, height):
+    """MPO, как у фото с телефона: два JPEG-кадра с EXIF и заголовок MPF
+    в первом (Pillow до 9.3 MPO не записывает)."""
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера'
+    frames = []
+    for color in ('red', 'blue'):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), color).save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        frames.append(buffer.getvalue())
+    first, second = frames
+
+    def segment(offset):
+        # TIFF-заголовок, IFD (версия, число кадров, таблица кадров) и
+        # сама таблица: первый кадр и смещение второго от заголовка.
+        tiff = b'MM\x00\x2a' + struct.pack('>LH', 8, 3)
+        tiff += struct.pack('>HHL4s', 0xB000, 7, 4, b'0100')
+        tiff += struct.pack('>HHLL', 0xB001, 4, 1, 2)
+        tiff += struct.pack('>HHLL', 0xB002, 7, 32, 50)
+        tiff += struct.pack('>L', 0)
+        tiff += struct.pack('>LLLHH', 0x20030000, len(first), 0, 0, 0)
+        tiff += struct.pack('>LLLHH', 0, len(second), offset, 0, 0)
+        data = b'MPF\x00' + tiff
+        return b'\xff\xe2' + struct.pack('>H', len(data) + 2) + data
+
+    # Смещение считается от TIFF-заголовка: после SOI и 8 байт APP2.
+    offset = len(first) + len(segment(0)) - 10
+    return SimpleUploadedFile(
+        'photo.jpg', first[:2] + segment(offset) + first[2:] + second,
+        content_type='image/jpeg',
+    )
+
+
+def animation(format_, exif=None):
+    buffer = BytesIO()
+    frames = [Image.new('RGB', (8, 8), color) for color in ('red', 'blue')]
+    options = {'exif': exif.tobytes()} if exif is not None else {}
+    frames[0].save(
+        buffer, format_, save_all=True, append_images=frames[1:], **options
+    )
+    return SimpleUploadedFile(
+        f'animation.{format_.lower()}', buffer.getvalue()
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=64)
+class NormalizeTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_large_photo_is_downscaled_and_stripped(self):
+        """Большое фото уменьшается, поворачивается и теряет EXIF."""
+        result = Image.open(normalize(photo(400, 200, orientation=6)))
+        self.assertEqual(result.size, (32, 64))
+        self.assertNotIn('exif', result.info)
+
+    def test_small_photo_loses_exif_only(self):
+        """Маленькое фото с EXIF пересохраняется в том же размере."""
+        result = Image.open(normalize(photo(40, 20)))
+        self.assertEqual(result.size, (40, 20))
+        self.assertNotIn('exif', result.info)
+
+    def test_clean_image_is_kept(self):
+        """Картинку без EXIF и в пределах размера не перекодируют."""
+        upload = SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        self.assertIs(normalize(upload), upload)
+        self.assertEqual(upload.read(), SMALL_GIF)
+
+    def test_mpo_is_stored_as_first_frame_without_exif(self):
+        """Фото с кадром глубины становится обычным JPEG без EXIF."""
+        upload = mpo(40, 20)
+        self.assertEqual(Image.open(upload).format, 'MPO')
+        result = Image.open(normalize(upload))
+        self.assertEqual(result.format, 'JPEG')
+        self.assertEqual(result.size, (40, 20))
+        self.assertNotIn('exif', result.info)
+        self.assertEqual(result.getpixel((0, 0))[0], 254)
+
+    def test_animated_gif_is_kept(self):
+        upload = animation('GIF')
+        self.assertIs(normalize(upload), upload)
+
+    @skipUnless(features.check('webp_anim'), 'Pillow без анимации WebP')
+    def test_animated_webp_loses_exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        result = Image.open(normalize(animation('WEBP', exif)))
+        self.assertEqual(result.n_frames, 2)
+        self.assertNotIn('exif', result.info)
+
+    def test_post_form_stores_dimensions(self):
+        """Пост сохраняет уже уменьшенную картинку и её размеры."""
+        user = User.objects.create_user(username='photographer')
+        client = Client()
+        client.force_login(user)
+        client.post(
+            reverse('posts:post_create'),
+            {'text': 'Фото', 'image': photo(400, 200)},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertEqual((post.image_width, post.image_height), (64, 32))
+        with Image.open(post.image) as stored:
+            self.assertEqual(stored.size, (64, 32))
+            self.assertNotIn('exif', stored.info)
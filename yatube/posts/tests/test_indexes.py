@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..utils import NEXT, encode_cursor
+
+User = get_user_model()
+
+# Таблицы, которые растут с числом постов и не должны читаться целиком.
+LARGE_TABLES = (
+    'posts_post',
+    'posts_comment',
+    'posts_follow',
+    'posts_timelineentry',
+    'posts_posttag',
+)
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц идут по индексам и не сортируют строки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост #тег', author=author, group=group
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text='Да')
+        Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.cursor = encode_cursor(NEXT, self.post.pub_date, self.post.pk)
+
+    def plans(self, url):
+        """План каждого SELECT страницы: SQL -> строки EXPLAIN."""
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if query['sql'].startswith('SELECT'):
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans[query['sql']] = [row[-1] for row in cursor]
+        return plans
+
+    def assert_indexed(self, url, index):
+        plans = self.plans(url)
+        for sql, plan in plans.items():
+            for step in plan:
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    for table in LARGE_TABLES:
+                        self.assertNotEqual(step, f'SCAN {table}')
+        self.assertTrue(
+            any(index in step for plan in plans.values() for step in plan),
+            f'{url} не использует {index}',
+        )
+
+    def test_feeds_use_composite_indexes(self):
+        cases = {
+            reverse('posts:index'): 'post_date_id_idx',
+            reverse('posts:group_list', args=['group']):
+                'post_group_date_id_idx',
+            reverse('posts:profile', args=['author']):
+                'post_author_date_id_idx',
+            reverse('posts:follow_index'): 'follow_user_author_idx',
+            reverse('posts:tag', args=['тег']): 'post_tag_date_post_idx',
+        }
+        for url, index in cases.items():
+            self.assert_indexed(url, index)
+            self.assert_indexed(f'{url}?cursor={self.cursor}', index)
+
+    def test_comments_use_composite_index(self):
+        for name in ('posts:post_detail', 'posts:post_comments'):
+            self.assert_indexed(
+                reverse(name, args=[self.post.pk]),
+                'comment_post_created_id_idx',
+            )
+
+    def test_profile_followed_ids_use_covering_index(self):
+        cache.clear()
+        plans = self.plans(reverse('posts:profile', args=['author']))
+        steps = [
+            step
+            for sql, plan in plans.items() if 'posts_follow' in sql
+            for step in plan
+        ]
+        self.assertTrue(steps)
+        for step in steps:
+            self.assertIn('SEARCH posts_follow USING COVERING INDEX', step)
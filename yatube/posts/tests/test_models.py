@@ -1,7 +1,12 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-from ..models import Group, Post
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -90,3 +95,67 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     group._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    """Счётчики меняются вместе с постами, комментариями и подписками."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='counted')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_count(self):
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 0)
+
+    def test_comment_count_survives_post_edit(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Коммент'
+        )
+        stale.text = 'Отредактированный пост'
+        stale.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_follow_counts(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(self.stats(self.author).follower_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_reconcile_counters_repairs_drift(self):
+        Comment.objects.create(post=self.post, author=self.reader, text='К')
+        AuthorStats.objects.filter(user=self.reader).delete()
+        AuthorStats.objects.filter(user=self.author).update(post_count=7)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.assertEqual(self.stats(self.reader).post_count, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_pages_of_user_without_stats_row(self):
+        """Пользователь из bulk_create без строки AuthorStats."""
+        cache.clear()
+        User.objects.bulk_create([User(username='bulk')])
+        user = User.objects.get(username='bulk')
+        post = Post.objects.create(author=user, text='Пост')
+        self.assertFalse(AuthorStats.objects.filter(user=user).exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['author_posts'], 1)
+        response = self.client.get(reverse('posts:profile', args=['bulk']))
+        self.assertContains(response, 'Всего постов: 1')
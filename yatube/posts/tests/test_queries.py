@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.queries import QueryRecorder, fingerprint
+
+from ..models import Post
+
+User = get_user_model()
+
+
+class QueryRecorderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(3)
+        ]
+        for author in cls.authors:
+            Post.objects.create(text='Пост', author=author)
+
+    def test_fingerprint_ignores_list_lengths(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s,\n %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO t (a) VALUES (%s), (%s)'),
+            'INSERT INTO t (a) VALUES (%s), ...',
+        )
+
+    def test_related_lookup_in_loop_is_n_plus_one(self):
+        with QueryRecorder() as recorder:
+            for post in Post.objects.all():
+                post.author.username
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(list(recorder.repeated().values()), [3])
+        self.assertTrue(
+            any('N+1' in problem for problem in recorder.problems(10))
+        )
+
+    def test_same_query_repeated_is_not_n_plus_one(self):
+        with QueryRecorder() as recorder:
+            for _ in range(3):
+                Post.objects.filter(author=self.authors[0]).exists()
+        self.assertEqual(recorder.repeated(), {})
+
+    def test_select_related_fits_budget(self):
+        with QueryRecorder() as recorder:
+            for post in Post.objects.select_related('author'):
+                post.author.username
+        self.assertEqual(recorder.problems(1, check_time=False), [])
+        self.assertEqual(len(recorder.problems(0, check_time=False)), 1)
+
+    @override_settings(QUERY_TIME_BUDGET=0)
+    def test_time_budget_can_be_skipped(self):
+        with QueryRecorder() as recorder:
+            Post.objects.exists()
+        self.assertEqual(len(recorder.problems(1)), 1)
+        self.assertEqual(recorder.problems(1, check_time=False), [])
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 0})
+    def test_middleware_logs_exceeded_budget(self):
+        cache.clear()
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('при бюджете 0', logs.output[0])
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from core.routers import PIN_COOKIE, REPLICA
+
+from ..models import Post
+
+User = get_user_model()
+
+
+class ReplicaRouterTest(TransactionTestCase):
+    """Реплика — второй файл SQLite, который догоняет основную базу
+    только в sync(), поэтому видно, с какой базы читала страница."""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connections.databases[REPLICA] = {
+            **connection.settings_dict,
+            'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        self.addCleanup(self.drop_replica)
+        self.author = User.objects.create_user(username='author')
+        self.client.force_login(self.author)
+        self.sync()
+
+    def drop_replica(self):
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        if hasattr(connections._connections, REPLICA):
+            delattr(connections._connections, REPLICA)
+
+    def sync(self):
+        """Копирует основную базу в реплику через backup API SQLite."""
+        connection.ensure_connection()
+        connections[REPLICA].ensure_connection()
+        connection.connection.backup(connections[REPLICA].connection)
+        # Закэшированное до синхронизации прочитано со старой реплики.
+        cache.clear()
+
+    def profile_posts(self):
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        return list(response.context['page_obj'])
+
+    def test_read_only_views_read_from_replica(self):
+        post = Post.objects.create(
+            text='Ещё не на реплике', author=self.author
+        )
+        self.client.logout()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(list(response.context['page_obj']), [])
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+        self.sync()
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_writer_reads_own_writes_from_primary(self):
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Новый пост')
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(self.profile_posts(), [post])
+        # Окно прошло: снова реплика, которая ещё отстаёт.
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.profile_posts(), [])
+        self.sync()
+        self.assertEqual(self.profile_posts(), [post])
+
+    def test_pages_from_replica_have_no_etag(self):
+        address = reverse('posts:profile', args=[self.author.username])
+        self.assertFalse(self.client.get(address).has_header('ETag'))
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertTrue(self.client.get(address).has_header('ETag'))
+
+    def test_reads_without_write_do_not_pin(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_other_views_read_from_primary(self):
+        post = Post.objects.create(
+            text='Ещё не на реплике', author=self.author
+        )
+        response = self.client.get(reverse('posts:post_edit', args=[post.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
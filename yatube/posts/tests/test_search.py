@@ -0,0 +1,89 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+from ..search import TABLE, SearchPaginator, match_expression, stem
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.cats = Post.objects.create(
+            text='Кот и ещё раз кот: коты спят.', author=cls.user
+        )
+        cls.cat = Post.objects.create(
+            text='Мы гуляли с котами по ёлкам.', author=cls.user
+        )
+        cls.dog = Post.objects.create(
+            text='Собака лает на прохожих.', author=cls.user
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query, per_page=10):
+        page = SearchPaginator(query, per_page).get_cursor_page()
+        return [post.pk for post in page]
+
+    def test_stem_strips_russian_endings(self):
+        self.assertEqual(stem('котами'), 'кот')
+        self.assertEqual(stem('собираться'), 'собира')
+        self.assertEqual(stem('кот'), 'кот')
+        self.assertEqual(match_expression('Ёлки, "палки"!'), '"елк"* "палк"*')
+        self.assertEqual(match_expression(' ?! '), '')
+
+    def test_word_forms_are_found_and_ranked_by_bm25(self):
+        self.assertEqual(self.found('коты'), [self.cats.pk, self.cat.pk])
+        self.assertEqual(self.found('ёлка'), [self.cat.pk])
+        self.assertEqual(self.found('кошки'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.dog.text = 'Теперь здесь тоже кот'
+        self.dog.save()
+        self.assertIn(self.dog.pk, self.found('кот'))
+        self.assertEqual(self.found('собака'), [])
+        Post.objects.filter(pk=self.cat.pk).update(text='Пусто')
+        Post.objects.filter(pk=self.cats.pk).delete()
+        self.assertEqual(self.found('кот'), [self.dog.pk])
+
+    def test_cursor_pages_cover_all_results(self):
+        first = SearchPaginator('кот', 1).get_cursor_page()
+        second = SearchPaginator('кот', 1).get_cursor_page(first.next_cursor)
+        self.assertEqual(list(first), [self.cats])
+        self.assertEqual(list(second), [self.cat])
+        self.assertEqual(second.next_cursor, '')
+        back = SearchPaginator('кот', 1).get_cursor_page(
+            second.previous_cursor
+        )
+        self.assertEqual(list(back), [self.cats])
+
+    @override_settings(POSTS_COUNT=1)
+    def test_search_page_keeps_query_in_cursor_links(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertEqual(list(response.context['page_obj']), [self.cats])
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;cursor=')
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dog]
+        )
+
+    def test_rebuild_command_restores_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        self.assertEqual(self.found('кот'), [])
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.found('кот'), [self.cats.pk, self.cat.pk])
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+
+from .. import thumbnails
+from ..management.commands.collect_orphaned_media import CURSOR_KEY
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+CONTENT = b'GIF89a-test-content'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+CONTENT_NAME = f'posts/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.gif'
+
+
+def gif_upload(name='image.gif'):
+    buffer = BytesIO()
+    Image.new('RGB', (2, 2), 'red').save(buffer, 'GIF')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageReferenceTest(TransactionTestCase):
+    """Ссылки на файл снимаются после коммита, поэтому транзакции
+    здесь настоящие."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(thumbnails.drain)
+        self.author = User.objects.create_user(username='author')
+
+    def test_reupload_of_same_image_keeps_one_reference(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=gif_upload()
+        )
+        name = post.image.name
+        # Превью строятся в фоне; удаление ниже не должно с ними гоняться.
+        thumbnails.drain()
+        post.image = gif_upload('again.gif')
+        post.save()
+        thumbnails.drain()
+        self.assertEqual(post.image.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(post.image.storage.exists(name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.storage.save('posts/one.GIF', ContentFile(CONTENT))
+        second = self.storage.save('posts/two.gif', ContentFile(CONTENT))
+        self.assertEqual(first, CONTENT_NAME)
+        self.assertEqual(second, CONTENT_NAME)
+        self.assertEqual(StoredFile.objects.get(name=first).references, 2)
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(first))),
+            [os.path.basename(first)],
+        )
+
+    def test_file_is_removed_with_last_reference(self):
+        for _ in range(2):
+            self.storage.save('posts/image.gif', ContentFile(CONTENT))
+        self.assertFalse(self.storage.release(CONTENT_NAME))
+        self.assertTrue(self.storage.exists(CONTENT_NAME))
+        self.assertTrue(self.storage.release(CONTENT_NAME))
+        self.assertFalse(self.storage.exists(CONTENT_NAME))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_upload_after_release_of_last_reference_keeps_file(self):
+        """release() последней ссылки, успевший раньше увеличения числа
+        ссылок новой загрузкой, не оставляет её без файла."""
+        self.storage.save('posts/image.gif', ContentFile(CONTENT))
+        add_references = self.storage.add_references
+
+        def release_first(name, count=1):
+            self.storage.release(name)
+            add_references(name, count)
+
+        with mock.patch.object(
+            self.storage, 'add_references', side_effect=release_first
+        ):
+            name = self.storage.save('posts/again.gif', ContentFile(CONTENT))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+
+    def test_migrate_post_images(self):
+        FileSystemStorage().save('posts/legacy.gif', ContentFile(CONTENT))
+        user = User.objects.create_user(username='author')
+        posts = [
+            Post.objects.create(
+                text='Пост', author=user, image='posts/legacy.gif'
+            )
+            for _ in range(2)
+        ]
+        call_command('migrate_post_images', batch_size=1, stdout=StringIO())
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, CONTENT_NAME)
+        self.assertEqual(
+            StoredFile.objects.get(name=CONTENT_NAME).references, 2
+        )
+        self.assertFalse(self.storage.exists('posts/legacy.gif'))
+
+
+def gif(color):
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectOrphanedMediaTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'posts'), True)
+        self.storage = Post._meta.get_field('image').storage
+        user = User.objects.create_user(username='author')
+        with mock.patch.object(thumbnails, 'schedule'):
+            self.post = Post.objects.create(
+                text='Пост',
+                author=user,
+                image=SimpleUploadedFile('kept.gif', gif('red'), 'image/gif'),
+            )
+        self.orphan = self.storage.save('posts/gone.gif', ContentFile(
+            gif('blue')
+        ))
+        self.thumbnail = thumbnails.backend.get_thumbnail(
+            ImageFile(self.orphan, self.storage), '2x2'
+        ).name
+        # Превью, оригинал которого удалили раньше.
+        self.stray = FileSystemStorage().save(
+            'posts/lost.0123456789ab.jpg', ContentFile(b'thumbnail')
+        )
+
+    def age_files(self):
+        for root, _, files in os.walk(TEMP_MEDIA_ROOT):
+            for name in files:
+                os.utime(os.path.join(root, name), (0, 0))
+
+    def collect(self):
+        call_command('collect_orphaned_media', sleep=0, stdout=StringIO())
+
+    def test_orphans_are_deleted_with_thumbnails(self):
+        self.age_files()
+        self.collect()
+        self.assertTrue(self.storage.exists(self.post.image.name))
+        for name in (self.orphan, self.thumbnail, self.stray):
+            self.assertFalse(self.storage.exists(name), name)
+        self.assertIsNone(
+            default.kvstore.get(ImageFile(self.orphan, self.storage))
+        )
+        self.assertFalse(StoredFile.objects.filter(name=self.orphan).exists())
+        self.assertIsNone(cache.get(CURSOR_KEY))
+
+    def test_recent_files_are_kept(self):
+        self.collect()
+        for name in (self.orphan, self.thumbnail, self.stray):
+            self.assertTrue(self.storage.exists(name), name)
+
+    def test_reupload_during_collection_is_kept(self):
+        """Файл, загруженный снова после выборки ссылок, не удаляется."""
+        self.age_files()
+        lock = self.storage.lock
+
+        def reupload_first(name):
+            # Загрузка успевает раньше, чем сборщик берёт блокировку.
+            patcher.stop()
+            self.storage.save('posts/again.gif', ContentFile(gif('blue')))
+            return lock(name)
+
+        patcher = mock.patch.object(self.storage, 'lock', reupload_first)
+        patcher.start()
+        self.collect()
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.assertEqual(
+            StoredFile.objects.get(name=self.orphan).references, 2
+        )
+
+    def test_walk_resumes_after_cursor(self):
+        self.age_files()
+        cache.set(CURSOR_KEY, self.orphan, None)
+        self.collect()
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.assertFalse(self.storage.exists(self.stray))
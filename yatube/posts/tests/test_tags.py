@@ -0,0 +1,89 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import tags
+from ..models import Post, PostTag, Tag
+
+User = get_user_model()
+
+
+class TagIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='author')
+
+    def count(self, name, kind=Tag.HASHTAG):
+        return Tag.objects.get(kind=kind, name=name).post_count
+
+    def test_extract(self):
+        self.assertEqual(
+            tags.extract('#Кино и #кино, @Ivan. mail@host.ru &#123; #2022'),
+            {(Tag.HASHTAG, 'кино'), (Tag.MENTION, 'ivan')},
+        )
+
+    def test_tags_follow_create_edit_and_delete(self):
+        post = Post.objects.create(text='#кино с @ivan', author=self.user)
+        Post.objects.create(text='Снова #кино', author=self.user)
+        self.assertEqual(self.count('кино'), 2)
+        self.assertEqual(self.count('ivan', Tag.MENTION), 1)
+
+        post.text = 'Теперь про #книги'
+        post.save()
+        self.assertEqual(self.count('кино'), 1)
+        self.assertEqual(self.count('ivan', Tag.MENTION), 0)
+        self.assertEqual(self.count('книги'), 1)
+
+        post.delete()
+        self.assertEqual(self.count('книги'), 0)
+        self.assertEqual(PostTag.objects.count(), 1)
+
+    @override_settings(POSTS_COUNT=2)
+    def test_tag_page_is_paginated_by_cursor(self):
+        posts = [
+            Post.objects.create(text=f'Пост {i} #кино', author=self.user)
+            for i in range(3)
+        ]
+        url = reverse('posts:tag', args=['Кино'])
+        first = self.client.get(url).context['page_obj']
+        self.assertEqual(list(first), posts[:0:-1])
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(second), posts[:1])
+        self.assertEqual(
+            self.client.get(reverse('posts:tag', args=['нет'])).status_code,
+            404,
+        )
+
+    def test_card_links_tags_and_escapes_text(self):
+        Post.objects.create(text='<b>#кино</b> @ivan', author=self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response,
+            '&lt;b&gt;<a href="/tags/%D0%BA%D0%B8%D0%BD%D0%BE/">#кино</a>'
+            '&lt;/b&gt; <a href="/mentions/ivan/">@ivan</a>',
+            html=False,
+        )
+
+    def test_popular_tags_are_read_from_rollup(self):
+        for text in ('#кино #книги', '#кино', '#кино #книги #музыка'):
+            Post.objects.create(text=text, author=self.user)
+        self.assertEqual(
+            [tag.name for tag in tags.popular()],
+            ['кино', 'книги', 'музыка'],
+        )
+        with self.assertNumQueries(0):
+            tags.popular()
+
+    def test_rebuild_tags_after_bulk_update(self):
+        post = Post.objects.create(text='#кино', author=self.user)
+        Post.objects.filter(pk=post.pk).update(text='#книги')
+        call_command('rebuild_tags', stdout=StringIO())
+        self.assertEqual(self.count('кино'), 0)
+        self.assertEqual(self.count('книги'), 1)
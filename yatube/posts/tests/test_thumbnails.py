@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import caching, thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post = Post.objects.create(
+                text='Пост с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile(name, content, 'image/gif'),
+            )
+        schedule.assert_called_once_with(post.pk, new_image=True)
+        return post
+
+    def test_new_image_is_scheduled_but_text_edit_is_not(self):
+        post = self.create_post()
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post.text = 'Новый текст'
+            post.save()
+        schedule.assert_not_called()
+
+    def test_failed_job_is_not_retried_on_every_render(self):
+        post = self.create_post('broken.gif', b'GIF89a - not an image')
+        with self.assertLogs(thumbnails.logger, 'ERROR'):
+            thumbnails._run(post.pk)
+        self.assertIsNotNone(cache.get(thumbnails.JOB_KEY.format(pk=post.pk)))
+        on_commit = 'posts.thumbnails.transaction.on_commit'
+        with mock.patch(on_commit) as submit:
+            thumbnails.schedule(post.pk)
+        submit.assert_not_called()
+        with mock.patch(on_commit) as submit:
+            thumbnails.schedule(post.pk, new_image=True)
+        submit.assert_called_once()
+
+    def test_generate_fills_kvstore_and_invalidates_card(self):
+        post = self.create_post()
+        self.assertIsNone(thumbnails.get_thumbnail(post.image, 'card'))
+        card_key = caching.card_key(post)
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        self.assertIsNotNone(thumbnails.get_thumbnail(post.image, 'card'))
+        self.assertNotEqual(caching.card_key(post), card_key)
+
+    def test_template_reads_only_precomputed_thumbnail(self):
+        post = self.create_post()
+        url = reverse('posts:post_detail', args=(post.pk,))
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.client.get(url)
+        schedule.assert_called_once_with(post.pk)
+        self.assertContains(response, post.image.url)
+        thumbnails.generate(post.pk)
+        thumbnail = thumbnails.get_thumbnail(post.image, 'card')
+        response = self.client.get(url)
+        self.assertContains(response, thumbnail.url)
+
+    def test_feed_page_reads_thumbnails_at_once(self):
+        posts = [self.create_post(f'small{i}.gif') for i in range(3)]
+        for post in posts:
+            thumbnails.generate(post.pk)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in posts:
+            post.refresh_from_db()
+            thumbnail = thumbnails.get_thumbnail(post.image, 'card')
+            self.assertContains(response, thumbnail.url)
+
+    def test_picture_lists_variants_by_width(self):
+        post = self.create_post()
+        thumbnails.generate(post.pk)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        post.refresh_from_db()
+        srcset = ', '.join(
+            '{} {}w'.format(
+                thumbnails.get_thumbnail(
+                    post.image, thumbnails.variant_name(width, 'JPEG')
+                ).url,
+                width,
+            )
+            for width in settings.POST_IMAGE_WIDTHS
+        )
+        self.assertContains(response, f'srcset="{srcset}"')
+        self.assertContains(response, 'width="960" height="339"')
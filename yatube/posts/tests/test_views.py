@@ -1,9 +1,17 @@
+from io import StringIO
+
 from django import forms
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from .. import caching
 from ..forms import PostForm
-from ..models import Group, Post, User, Follow
+from ..models import (Comment, Follow, Group, Post, PulledAuthor,
+                      TimelineEntry, User)
 
 
 class PostsViewsTests(TestCase):
@@ -177,6 +185,46 @@ class PaginatorTests(TestCase):
                 response = self.user_client.get(address)
                 self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages(self):
+        """Курсоры ведут вперёд и назад без пропусков и повторов."""
+        addresses = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for address in addresses:
+            with self.subTest(address=address):
+                first = self.user_client.get(address).context['page_obj']
+                self.assertEqual(first.previous_cursor, '')
+                second = self.user_client.get(
+                    address, {'cursor': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second), 3)
+                self.assertEqual(second.next_cursor, '')
+                self.assertEqual(
+                    set(first) | set(second), set(Post.objects.all())
+                )
+                back = self.user_client.get(
+                    address, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_cursor_page_skips_count(self):
+        """Keyset-страница не считает COUNT(*) по ленте."""
+        first = self.user_client.get(reverse('posts:index'))
+        token = first.context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.user_client.get(reverse('posts:index'), {'cursor': token})
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        )
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.user_client.get(
+            reverse('posts:index'), {'cursor': 'garbage'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
 
 class FollowTest(TestCase):
     user = None
@@ -291,3 +339,401 @@ class FollowTest(TestCase):
             new_response_non_follower.context['page_obj'].object_list
         )
         self.assertEqual(non_follower_post_count, non_follower_new_post_count)
+
+    def test_timeline_follow_backfill_and_unfollow_prune(self):
+        """Подписка заполняет ленту постами автора, отписка — чистит."""
+        self.second_authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.user.username}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.second_user, post=self.post).exists())
+        self.second_authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.user.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.second_user).exists())
+
+    def test_rebuild_timelines_repairs_drift(self):
+        """Команда rebuild_timelines восстанавливает потерянные записи."""
+        Follow.objects.create(user=self.second_user, author=self.user)
+        TimelineEntry.objects.all().delete()
+        TimelineEntry.objects.create(
+            user=self.non_follower, post=self.post, pub_date=self.post.pub_date
+        )
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(self.second_user.pk, self.post.pk)]
+        )
+
+
+@override_settings(FEED_PULL_THRESHOLD=2, POSTS_COUNT=3)
+class HybridFeedTest(TestCase):
+    """Посты «популярных» авторов подмешиваются в ленту при чтении."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.star = User.objects.create_user(username='star')
+        cls.regular = User.objects.create_user(username='regular')
+        Follow.objects.create(user=cls.reader, author=cls.regular)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=author)
+            for i, author in enumerate([cls.star, cls.regular] * 3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def test_popular_author_is_pulled(self):
+        self.assertTrue(PulledAuthor.objects.filter(author=self.star).exists())
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists()
+        )
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        first = self.client.get(
+            reverse('posts:follow_index')).context['page_obj']
+        second = self.client.get(
+            reverse('posts:follow_index'), {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(first) + list(second), self.posts[::-1])
+        self.assertEqual(second.next_cursor, '')
+
+    def test_reclassify_demotes_author(self):
+        Follow.objects.filter(user=self.fan).delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertFalse(PulledAuthor.objects.exists())
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=self.reader, post__author=self.star).count(),
+            3
+        )
+
+
+@override_settings(COMMENTS_COUNT=2)
+class CommentsTest(TestCase):
+    """Страница поста показывает только его комментарии, порциями."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(text='С комментариями', author=cls.user)
+        cls.other_post = Post.objects.create(text='Другой', author=cls.user)
+        cls.comments = [
+            Comment.objects.create(post=cls.post, author=cls.user, text=str(i))
+            for i in range(3)
+        ]
+        Comment.objects.create(post=cls.other_post, author=cls.user, text='x')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments_of_post(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        self.assertEqual(list(response.context['comments']), self.comments[:2])
+        self.assertEqual(response.context['comments_count'], 3)
+
+    def test_load_more_comments(self):
+        first = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'cursor': first.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(list(response.context['comments']), self.comments[2:])
+        self.assertEqual(response.context['comments'].next_cursor, '')
+
+
+class FeedCacheTest(TestCase):
+    """Фрагменты лент обновляются сразу после записи поста."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cached_author')
+        cls.group = Group.objects.create(
+            title='Кэш', slug='cache-group', description='Группа'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other-group', description='Группа'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Первоначальный текст', author=self.author, group=self.group
+        )
+        self.pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        )
+        for address in self.pages:
+            self.client.get(address)
+
+    def test_edit_invalidates_feeds(self):
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for address in self.pages:
+            with self.subTest(address=address):
+                self.assertContains(self.client.get(address), 'Новый текст')
+
+    def test_delete_invalidates_feeds(self):
+        self.post.delete()
+        for address in self.pages:
+            with self.subTest(address=address):
+                self.assertNotContains(
+                    self.client.get(address), 'Первоначальный текст'
+                )
+
+    def test_moving_post_invalidates_previous_group(self):
+        self.post.group = self.other_group
+        self.post.save()
+        response = self.client.get(self.pages[1])
+        self.assertNotContains(response, 'Первоначальный текст')
+
+    def test_unrelated_write_keeps_cached_fragment(self):
+        Post.objects.filter(pk=self.post.pk).update(text='В обход сигналов')
+        self.assertContains(self.client.get(self.pages[0]), 'Первоначальный')
+
+
+class PostCardCacheTest(TestCase):
+    """Карточка поста кэшируется один раз и переиспользуется лентами."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(
+            title='Карточки', slug='cards', description='Группа'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Текст карточки', author=self.author, group=self.group
+        )
+
+    def test_card_is_shared_between_feeds(self):
+        self.client.get(reverse('posts:index'))
+        cached = cache.get(caching.card_key(self.post))
+        self.assertIn('Текст карточки', cached)
+        cache.set(caching.card_key(self.post), 'Карточка из кэша')
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        self.assertContains(response, 'Карточка из кэша')
+
+    def test_edit_changes_card_key(self):
+        old_key = caching.card_key(self.post)
+        self.post.text = 'Новый текст карточки'
+        self.post.save()
+        self.assertNotEqual(caching.card_key(self.post), old_key)
+
+    def test_new_post_keeps_other_cards(self):
+        old_key = caching.card_key(self.post)
+        Post.objects.create(
+            text='Ещё пост', author=self.author, group=self.group
+        )
+        self.assertEqual(caching.card_key(self.post), old_key)
+
+    def test_group_and_author_changes_reach_cards(self):
+        self.client.get(reverse('posts:index'))
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed-cards'
+        group.save()
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        self.post.refresh_from_db()
+        card = cache.get(caching.card_key(self.post))
+        self.assertIsNone(card)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, reverse('posts:group_list', args=['renamed-cards'])
+        )
+        self.assertContains(response, 'Новое Имя')
+
+
+class AnonymousPageCacheTest(TestCase):
+    """Страницы для анонимов отдаются из кэша до записи в их ключи."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='page_author')
+        cls.reader = User.objects.create_user(username='page_reader')
+        cls.group = Group.objects.create(
+            title='Страницы', slug='pages', description='Группа'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Пост страницы', author=self.author, group=self.group
+        )
+        self.detail = reverse('posts:post_detail', args=[self.post.pk])
+
+    def test_second_request_is_hit(self):
+        self.assertEqual(self.client.get(self.detail)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.detail)['X-Page-Cache'], 'HIT')
+        self.assertEqual(caching.page_stats(), {'hit': 1, 'miss': 1})
+
+    def test_comment_purges_post_page_only(self):
+        index = reverse('posts:index')
+        self.client.get(self.detail)
+        self.client.get(index)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Свежий комментарий'
+        )
+        response = self.client.get(self.detail)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Свежий комментарий')
+        self.assertEqual(self.client.get(index)['X-Page-Cache'], 'HIT')
+
+    def test_post_edit_purges_feeds(self):
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            self.detail,
+        )
+        for address in pages:
+            self.client.get(address)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        for address in pages:
+            with self.subTest(address=address):
+                self.assertContains(
+                    self.client.get(address), 'Исправленный пост'
+                )
+
+    def test_authorized_user_bypasses_cache(self):
+        self.client.get(self.detail)
+        self.client.force_login(self.reader)
+        response = self.client.get(self.detail)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+
+class ConditionalGetTest(TestCase):
+    """Повторный запрос с If-None-Match получает 304 до выборки ленты."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.post = Post.objects.create(text='Пост с ETag', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def test_not_modified(self):
+        addresses = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        for address in addresses:
+            with self.subTest(address=address):
+                etag = self.client.get(address)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(
+                        address, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                # Сессия, пользователь и одна выборка для ETag.
+                self.assertLessEqual(len(queries), 3)
+
+    def test_comment_changes_post_etag(self):
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.client.get(address)['ETag']
+        Comment.objects.create(post=self.post, author=self.author, text='К')
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_relogin_changes_etag_of_page_with_form(self):
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.client.get(address)['ETag']
+        self.client.logout()
+        self.client.force_login(self.author)
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        address = reverse('posts:index')
+        etag = self.client.get(address)['ETag']
+        self.client.logout()
+        self.assertNotEqual(self.client.get(address)['ETag'], etag)
+
+
+class ProfileHeaderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def header(self):
+        author = caching.author_by_username(self.author.username)
+        following = author.pk in caching.followed_ids(self.reader.pk)
+        return author.stats.post_count, following
+
+    def test_header_is_cached_per_author_and_viewer(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.header(), (1, False))
+        # Автор кладётся в кэш со второго обращения.
+        self.header()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.header(), (1, False))
+
+    def test_follow_button_follows_subscription(self):
+        address = reverse('posts:profile', args=[self.author.username])
+        self.assertFalse(self.client.get(address).context['following'])
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        response = self.client.get(address)
+        self.assertTrue(response.context['following'])
+        self.assertEqual(response.context['author'].stats.follower_count, 1)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(self.client.get(address).context['following'])
+
+    def test_cache_holds_only_profile_fields(self):
+        for _ in range(2):
+            caching.author_by_username(self.author.username)
+        key = caching.AUTHOR_KEY.format(
+            pk=self.author.pk,
+            generation=caching.generation(
+                caching.author_scope(self.author.pk)
+            ),
+        )
+        self.assertEqual(set(cache.get(key)), set(caching.AUTHOR_FIELDS))
+
+    def test_renamed_and_deleted_author_is_not_served_from_cache(self):
+        for _ in range(2):
+            caching.author_by_username('author')
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed'
+        author.save()
+        self.assertIsNone(caching.author_by_username('author'))
+        self.assertEqual(caching.author_by_username('renamed').pk, author.pk)
+        for _ in range(2):
+            caching.author_by_username('renamed')
+        author.delete()
+        self.assertIsNone(caching.author_by_username('renamed'))
@@ -0,0 +1,247 @@
+"""Превью картинок постов, построенные заранее.
+
+Геометрии превью перечислены в settings.POST_THUMBNAILS, к ним
+добавляются адаптивные варианты карточки: POST_IMAGE_WIDTHS в каждом из
+POST_IMAGE_FORMATS (для <picture>/srcset). Когда пост сохраняется с
+новой картинкой, все превью строятся в фоновом пуле потоков и
+записываются в key-value хранилище sorl, а шаблоны (тег post_picture)
+только читают готовые записи: декодирование и ресайз больше не попадают
+в запрос первого читателя. Файлы превью лежат рядом с оригиналом.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import caching
+from .models import Post
+
+JOB_KEY = 'posts:thumbnail-job:{pk}'
+CARD = 'card'
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class PrecomputedBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет найти превью, не создавая его."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile превью: то же имя, что дал бы get_thumbnail."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        """Превью лежит рядом с оригиналом: posts/photo.<ключ>.webp."""
+        key = tokey(source.key, geometry_string, serialize(options))
+        stem = os.path.splitext(source.name)[0]
+        return f'{stem}.{key[:12]}.{EXTENSIONS[options["format"]]}'
+
+    def get_cached(self, file_, geometry_string, **options):
+        """Готовое превью из key-value хранилища или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+
+backend = PrecomputedBackend()
+
+
+def supported_formats():
+    """POST_IMAGE_FORMATS, которые умеет записывать установленный Pillow."""
+    return [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_ != 'WEBP' or features.check('webp')
+    ]
+
+
+def variant_name(width, format_):
+    return f'{CARD}-{width}-{format_.lower()}'
+
+
+def specs():
+    """Все превью: имя -> (геометрия, опции sorl)."""
+    result = dict(settings.POST_THUMBNAILS)
+    geometry, options = settings.POST_THUMBNAILS[CARD]
+    card_width, card_height = (int(side) for side in geometry.split('x'))
+    for format_ in supported_formats():
+        for width in settings.POST_IMAGE_WIDTHS:
+            height = round(card_height * width / card_width)
+            result[variant_name(width, format_)] = (
+                f'{width}x{height}', {**options, 'format': format_}
+            )
+    return result
+
+
+def get_thumbnail(image, name):
+    """Готовое превью image по имени из specs() или None."""
+    geometry, options = specs()[name]
+    return backend.get_cached(image, geometry, **options)
+
+
+def _get_raw_many(keys):
+    """Сырые записи key-value хранилища sorl: кэш, затем одна выборка."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missed = [key for key in keys if key not in values]
+    if missed:
+        found = dict(
+            KVStoreModel.objects
+            .filter(key__in=missed)
+            .values_list('key', 'value')
+        )
+        # Как и сам sorl, запоминаем и отсутствие записи.
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missed}
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        key: None if value == EMPTY_VALUE else value
+        for key, value in values.items()
+    }
+
+
+def prefetch(posts):
+    """Находит все превью картинок постов страницы одним чтением.
+
+    Результат кладётся в post.thumbnails (имя -> ImageFile или None), и
+    тег post_picture берёт его оттуда, не обращаясь к хранилищу.
+    """
+    keys = {}
+    for post in posts:
+        post.thumbnails = {}
+        if not post.image:
+            continue
+        for name, (geometry, options) in specs().items():
+            post.thumbnails[name] = None
+            thumbnail = backend.thumbnail_file(
+                post.image, geometry, **options
+            )
+            # Разные имена могут совпасть: card и card-960-jpeg — одно превью.
+            keys.setdefault(add_prefix(thumbnail.key), []).append(
+                (post, name)
+            )
+    for key, value in _get_raw_many(list(keys)).items():
+        if value:
+            for post, name in keys[key]:
+                post.thumbnails[name] = deserialize_image_file(value)
+
+
+def generate(post_id):
+    """Строит все превью картинки поста.
+
+    Затем сдвигает updated_at и поколения поста: карточки и страницы,
+    закэшированные с оригиналом вместо превью, перестают читаться.
+    Возвращает False, если исходный файл не прочитался: sorl проглатывает
+    ошибки декодирования и ничего не записывает в хранилище.
+    """
+    post = (
+        Post.objects
+        .filter(pk=post_id)
+        .only('image', 'author_id', 'group_id')
+        .first()
+    )
+    if post is None or not post.image:
+        return True
+    for geometry, options in specs().values():
+        backend.get_thumbnail(post.image, geometry, **options)
+    if any(get_thumbnail(post.image, name) is None for name in specs()):
+        return False
+    Post.objects.filter(pk=post_id).update(updated_at=timezone.now())
+    caching.bump(*caching.post_scopes(post))
+    return True
+
+
+def release_image(name):
+    """После коммита снимает ссылку поста на файл картинки.
+
+    Если хранилище удалило файл (ссылок не осталось), удаляются и его
+    превью вместе с записями key-value хранилища.
+    """
+    storage = Post._meta.get_field('image').storage
+    if not name or not hasattr(storage, 'release'):
+        return
+
+    def release():
+        if storage.release(name):
+            default.kvstore.delete(ImageFile(name, storage))
+
+    transaction.on_commit(release)
+
+
+def _run(post_id):
+    key = JOB_KEY.format(pk=post_id)
+    try:
+        built = generate(post_id)
+        if not built:
+            logger.error('Не удалось прочитать картинку поста %s', post_id)
+    except Exception:
+        logger.exception('Не удалось построить превью поста %s', post_id)
+        built = False
+    finally:
+        close_old_connections()
+    if built:
+        cache.delete(key)
+    else:
+        # Битая картинка не перестраивается с каждым показом поста: ключ
+        # задачи остаётся до повторной попытки или до новой картинки.
+        cache.set(key, 1, settings.THUMBNAIL_RETRY_DELAY)
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def drain():
+    """Дожидается всех поставленных задач; пул создастся заново."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def schedule(post_id, new_image=False):
+    """Ставит построение превью в фоновый пул после коммита транзакции.
+
+    Повторные вызовы, пока задача для поста не завершилась или после
+    неудачи не прошло THUMBNAIL_RETRY_DELAY, ничего не делают. Новая
+    картинка (new_image) ставится в пул всегда.
+    """
+    key = JOB_KEY.format(pk=post_id)
+    if new_image:
+        cache.delete(key)
+    if cache.add(key, 1, settings.CACHE_LOCK_TIMEOUT):
+        transaction.on_commit(lambda: _pool().submit(_run, post_id))
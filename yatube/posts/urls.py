@@ -1,6 +1,7 @@
 from django.urls import path
 
 from . import views
+from .models import Tag
 
 app_name = 'posts'
 
@@ -11,8 +12,18 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('create/', views.post_create, name='post_create'),
+    path('search/', views.search, name='search'),
+    path('tags/<str:name>/', views.tag_posts, name='tag'),
+    path(
+        'mentions/<str:name>/',
+        views.tag_posts,
+        {'kind': Tag.MENTION},
+        name='mention'
+    ),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -1,9 +1,136 @@
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+from . import caching
 
-def paginate_queryset(posts, request):
-    paginator = Paginator(posts, settings.POSTS_COUNT)
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, pub_date, pk):
+    """Непрозрачный токен позиции в ленте: направление и ключ
+    (pub_date, id)."""
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Разбирает токен; для битого токена возвращает None."""
+    try:
+        direction, pub_date, pk = (
+            urlsafe_base64_decode(token).decode().split('|')
+        )
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре (дата, id), по умолчанию (pub_date, id).
+
+    Страница выбирается условием по ключу последней показанной записи,
+    поэтому не нужны ни COUNT(*), ни OFFSET: любая страница стоит столько
+    же, сколько первая. Переходы по страницам идут через
+    page.next_cursor и page.previous_cursor.
+    """
+
+    date_field = 'pub_date'
+    key_field = 'pk'
+    newest_first = True
+
+    def get_cursor_page(self, token=None):
+        cursor = self.parse_cursor(token) if token else None
+        if cursor is None:
+            token = ''
+            direction = NEXT
+            rows = self._fetch(None, descending=self.newest_first)
+        else:
+            direction, key, pk = cursor
+            rows = self._fetch(
+                (key, pk),
+                descending=(direction == NEXT) == self.newest_first,
+            )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        page = Page(rows, 1, self)
+        page.cursor = token
+        page.next_cursor = page.previous_cursor = ''
+        if rows and has_next:
+            page.next_cursor = self._cursor_for(NEXT, rows[-1])
+        if rows and has_previous:
+            page.previous_cursor = self._cursor_for(PREVIOUS, rows[0])
+        return page
+
+    def parse_cursor(self, token):
+        """(направление, ключ, id) из токена или None."""
+        return decode_cursor(token)
+
+    def _fetch(self, after, descending):
+        return list(self.keyset_slice(self.object_list, after, descending))
+
+    def keyset_slice(self, queryset, after, descending, key_field=None):
+        """Не больше per_page + 1 строк queryset за ключом after."""
+        key_field = key_field or self.key_field
+        if after is not None:
+            pub_date, pk = after
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.date_field}__{lookup}': pub_date})
+                | Q(**{
+                    self.date_field: pub_date,
+                    f'{key_field}__{lookup}': pk,
+                })
+            )
+        sign = '-' if descending else ''
+        ordered = queryset.order_by(
+            f'{sign}{self.date_field}', f'{sign}{key_field}'
+        )
+        return ordered[:self.per_page + 1]
+
+    def _cursor_for(self, direction, obj):
+        return encode_cursor(
+            direction,
+            getattr(obj, self.date_field),
+            getattr(obj, self.key_field),
+        )
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста: от старых к новым по (created, id)."""
+
+    date_field = 'created'
+    newest_first = False
+
+
+def paginate_queryset(posts, request, cursor_paginator=None):
+    """Страница ленты: keyset-курсор, а для старых ссылок ?page= — OFFSET.
+
+    cursor_paginator — готовый keyset-пагинатор для лент, которые
+    собираются не из одного запроса posts (см. posts.feeds).
+    """
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        paginator = Paginator(posts, settings.POSTS_COUNT)
+        generations = getattr(request, 'surrogate_keys', None)
+        if generations:
+            # Страница помечена поколениями своих лент (caching.tag_request):
+            # пока они не менялись, не меняется и число постов.
+            paginator.count = caching.cached_count(posts, generations)
+        return paginator.get_page(page_number)
+    if cursor_paginator is None:
+        cursor_paginator = CursorPaginator(posts, settings.POSTS_COUNT)
+    return cursor_paginator.get_cursor_page(request.GET.get('cursor'))
@@ -1,23 +1,52 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
+
+from core.routers import replica_reads
 
+from . import caching, counters, tags
+from .feeds import FollowFeedPaginator
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
-from .utils import paginate_queryset
+from .models import Follow, Group, Post, Tag, User
+from .search import SearchPaginator
+from .utils import CommentPaginator, paginate_queryset
+
+
+def index_etag(request):
+    return caching.etag_for(request, caching.GLOBAL)
 
 
+@replica_reads
+@condition(etag_func=index_etag)
 def index(request):
+    caching.tag_request(request, caching.GLOBAL)
     post_list = Post.objects.select_related('author', 'group')
-    group_list = Group.objects.all()
     context = {
         'page_obj': paginate_queryset(post_list, request),
-        'group_obj': group_list
+        'group_obj': caching.groups(),
+        'popular_tags': tags.popular(),
     }
     return render(request, 'posts/index.html', context)
 
 
+def group_etag(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    )
+    if group_id is None:
+        return None
+    return caching.etag_for(request, caching.group_scope(group_id))
+
+
+@replica_reads
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
+    caching.tag_request(request, caching.group_scope(group.pk))
     post_list = group.posts.select_related('author')
     context = {
         'group': group,
@@ -27,14 +56,30 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+def profile_etag(request, username):
+    author = caching.author_by_username(username)
+    if author is None:
+        return None
+    scopes = [caching.author_scope(author.pk)]
+    if request.user.is_authenticated:
+        # Кнопка «Подписаться/Отписаться» зависит от подписок зрителя.
+        scopes.append(caching.author_scope(request.user.pk))
+    return caching.etag_for(request, *scopes)
+
+
+@replica_reads
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = caching.author_by_username(username)
+    if author is None:
+        raise Http404
+    caching.tag_request(request, caching.author_scope(author.pk))
     post_list = author.posts.select_related('group')
+    # Шапка профиля — автор со счётчиками — общая для всех зрителей, а
+    # кнопка подписки берётся из закэшированных подписок зрителя.
     following = (
         request.user.is_authenticated
-        and Follow.objects.filter(
-            user__username=request.user,
-            author__username=username).exists()
+        and author.pk in caching.followed_ids(request.user.pk)
     )
     context = {
         'author': author,
@@ -44,20 +89,88 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def post_etag(request, post_id):
+    post = Post.objects.filter(pk=post_id).values('author', 'group').first()
+    if post is None:
+        return None
+    scopes = [
+        caching.post_scope(post_id),
+        caching.author_scope(post['author']),
+    ]
+    if post['group'] is not None:
+        scopes.append(caching.group_scope(post['group']))
+    return caching.etag_for(request, *scopes)
+
+
+@replica_reads
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    author_posts = post.author.posts.count()
+    caching.tag_request(request, caching.post_scope(post_id))
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    caching.tag_request(request, caching.author_scope(post.author_id))
+    if post.group_id is not None:
+        caching.tag_request(request, caching.group_scope(post.group_id))
+    author_posts = counters.stats_of(post.author).post_count
     comment_form = CommentForm()
-    comments = Comment.objects.select_related('post', 'author')
+    comments = CommentPaginator(
+        post.comments.select_related('author'), settings.COMMENTS_COUNT
+    ).get_cursor_page()
     context = {
         'post': post,
         'author_posts': author_posts,
         'form': comment_form,
         'comments': comments,
+        'comments_count': post.comment_count,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    caching.tag_request(request, caching.post_scope(post_id))
+    post = get_object_or_404(Post, id=post_id)
+    comments = CommentPaginator(
+        post.comments.select_related('author'), settings.COMMENTS_COUNT
+    ).get_cursor_page(request.GET.get('cursor'))
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def tag_posts(request, name, kind=Tag.HASHTAG):
+    """Посты с хештегом или упоминанием, новые первыми."""
+    caching.tag_request(request, caching.GLOBAL)
+    tag = get_object_or_404(Tag, kind=kind, name=name.lower())
+    context = {
+        'tag': tag,
+        'page_obj': tags.TagPaginator(
+            tag, settings.POSTS_COUNT
+        ).get_cursor_page(request.GET.get('cursor')),
+    }
+    return render(request, 'posts/tag_list.html', context)
+
+
+def search(request):
+    """Поиск по текстам постов, лучшие совпадения первыми."""
+    caching.tag_request(request, caching.GLOBAL)
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = SearchPaginator(
+            query, settings.POSTS_COUNT
+        ).get_cursor_page(request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'cursor_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -109,7 +222,13 @@ def follow_index(request):
         .select_related('author', 'group')
         .filter(author__following__user=request.user)
     )
-    page_obj = paginate_queryset(posts, request)
+    page_obj = paginate_queryset(
+        posts,
+        request,
+        cursor_paginator=FollowFeedPaginator(
+            request.user, settings.POSTS_COUNT
+        ),
+    )
     context = {
         'page_obj': page_obj,
     }
@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PrimaryPinMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +65,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -95,8 +98,40 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами (см. core/db.py).
+        'CONN_MAX_AGE': 600,
     }
 }
+# Страницы только для чтения (core.routers.replica_reads) читают с
+# базы 'replica', если добавить её в DATABASES; после своей записи
+# пользователь столько секунд читает с основной базы.
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS: int = 10
+# PRAGMA для каждого нового соединения SQLite (core/db.py): WAL, чтобы
+# писатель не блокировал читателей, mmap и кэш страниц (отрицательный
+# cache_size — в КиБ) и ожидание занятой базы в миллисекундах вместо
+# немедленной ошибки «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+# Бюджет SQL на один HTTP-запрос (core/queries.py): сколько запросов по
+# умолчанию и по имени URL, сколько секунд на все запросы и со скольких
+# повторов одной формы запроса с разными параметрами это N+1. Нарушения
+# пишутся в лог 'core.queries', тесты проверяют те же бюджеты.
+QUERY_BUDGET: int = 10
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 6,
+    'posts:profile': 6,
+    'posts:post_detail': 6,
+}
+QUERY_TIME_BUDGET: float = 0.2
+N_PLUS_ONE_THRESHOLD: int = 3
 
 
 # Password validation
@@ -140,6 +175,15 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 # Переменная количества постов на странице:
 POSTS_COUNT: int = 10
+# Сколько комментариев показывать на странице поста и догружать за раз:
+COMMENTS_COUNT: int = 20
+# Сколько хештегов показывать в виджете популярных тегов:
+POPULAR_TAGS_COUNT: int = 10
+# Размер пачки при раскладке постов по лентам подписчиков:
+TIMELINE_BATCH_SIZE: int = 500
+# С какого числа подписчиков посты автора не раскладываются по лентам,
+# а подмешиваются при чтении:
+FEED_PULL_THRESHOLD: int = 1000
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -148,12 +192,74 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Загрузки хранятся по хешу содержимого без дублей (core/storage.py),
+# а превью sorl пишет под собственными именами.
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# Оригиналы картинок при загрузке уменьшаются до этой длинной стороны и
+# теряют EXIF (posts/images.py); JPEG пересохраняется с таким качеством.
+POST_IMAGE_MAX_SIDE: int = 2560
+POST_IMAGE_QUALITY: int = 85
+# Превью картинок постов: имя -> (геометрия, опции sorl). Строятся в
+# фоне при сохранении картинки (posts.thumbnails), шаблоны их только
+# читают.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Адаптивные варианты превью карточки для <picture>/srcset: ширины и
+# форматы (WEBP пропускается, если Pillow собран без libwebp).
+POST_IMAGE_WIDTHS = (480, 720, 960)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+# Потоков в пуле, который строит превью:
+THUMBNAIL_WORKERS: int = 2
+# Через сколько секунд повторить превью, которое не удалось построить
+# (например, из битой картинки):
+THUMBNAIL_RETRY_DELAY: int = 60 * 60
+
+# Фрагменты лент сбрасываются по записи (posts.caching), так что могут
+# жить долго:
+FEED_CACHE_TIMEOUT: int = 60 * 60 * 6
+# Карточка поста версионируется его updated_at и не устаревает:
+POST_CARD_CACHE_TIMEOUT: int = 60 * 60 * 24
+# Страницы для анонимов сбрасываются по surrogate-ключам (posts.middleware):
+PAGE_CACHE_TIMEOUT: int = 60 * 60
+# Список групп и авторы для профиля, ключи версионируются поколениями:
+OBJECT_CACHE_TIMEOUT: int = 60 * 60
+# Число постов для ссылок ?page= сбрасывается поколениями страницы:
+COUNT_CACHE_TIMEOUT: int = 60 * 10
+# Защита от одновременного пересчёта (posts.caching.cached_recompute):
+# сколько после срока отдавать прежнее значение, пока его пересчитывают,
+CACHE_STALE_TIMEOUT: int = 60 * 10
+# через сколько секунд замок пересчёта снимается сам,
+CACHE_LOCK_TIMEOUT: int = 30
+# сколько ждать чужого пересчёта, если прежнего значения нет,
+CACHE_LOCK_WAIT: float = 2
+# и насколько охотно пересчитывать заранее (0 — только по сроку).
+CACHE_EARLY_BETA: float = 1.0
+
+# Общий для всех воркеров кэш в файле SQLite (WAL) и LRU каждого
+# процесса перед ним, см. core/cache.py. Чужие записи процесс видит не
+# позже чем через LOCAL_TIMEOUT секунд.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+            'LOCAL_TIMEOUT': 2,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+        },
     }
 }
+# Тесты получают собственные файлы кэша (core/test_runner.py).
+TEST_RUNNER = 'core.test_runner.IsolatedCacheRunner'
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
\ No newline at end of file